@@ -1,10 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
     
     def ready(self):
+        from . import signals  # connect signal handlers
+        
+        # Detection files are normally ingested by the standalone
+        # run_detection_ingest command; in-process ingestion is opt-in
+        if not getattr(settings, 'DETECTION_INGEST_AUTOSTART', False):
+            return
+        
         # Start detection processor when Django is fully loaded
         try:
             from .detection_handler import detection_processor
@@ -0,0 +1,250 @@
+import fcntl
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+
+from .metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = '.gz'
+INDEX_SUFFIX = '.idx'
+
+# Files are streamed into their segment this much at a time, so memory stays flat however large they are
+COPY_CHUNK = 1024 * 1024
+
+
+class DetectionArchive:
+    """
+    Daily compressed segments of processed detection files: blocks of gzip
+    members plus an index of each file's member and offset, so one file is
+    fetched with one seek. Files leave processed/ only once indexed.
+    """
+
+    def __init__(self, processed_dir=None, archive_dir=None):
+        json_dir = str(settings.JSON_DETECTIONS_DIR)
+        self.processed_dir = str(processed_dir or os.path.join(json_dir, 'processed'))
+        self.archive_dir = str(archive_dir or getattr(settings, 'DETECTION_ARCHIVE_DIR', os.path.join(json_dir, 'archive')))
+        self.compression_level = getattr(settings, 'DETECTION_ARCHIVE_COMPRESSION_LEVEL', 6)
+        self.block_bytes = getattr(settings, 'DETECTION_ARCHIVE_BLOCK_BYTES', 256 * 1024)
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+    def segment_path(self, day):
+        return os.path.join(self.archive_dir, f'detections-{day:%Y%m%d}{SEGMENT_SUFFIX}')
+
+    def index_path(self, day):
+        return os.path.join(self.archive_dir, f'detections-{day:%Y%m%d}{INDEX_SUFFIX}')
+
+    def days(self):
+        """Days that have a segment, oldest first"""
+        days = []
+        for filename in os.listdir(self.archive_dir):
+            if filename.startswith('detections-') and filename.endswith(INDEX_SUFFIX):
+                try:
+                    days.append(datetime.strptime(filename[len('detections-'):-len(INDEX_SUFFIX)], '%Y%m%d').date())
+                except ValueError:
+                    continue
+        return sorted(days)
+
+    def index(self, day):
+        """Index entries of a day's segment, in segment order"""
+        return self._read_index(day)[0]
+
+    def _read_index(self, day):
+        """Index entries and the length of the index file they cover"""
+        entries = []
+        valid = 0
+        try:
+            with open(self.index_path(day), 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # A torn last line from an interrupted run
+                        break
+                    entries.append(json.loads(line))
+                    valid += len(line)
+        except FileNotFoundError:
+            pass
+        return entries, valid
+
+    def compact(self, min_age=300, limit=None):
+        """
+        Move processed files at least `min_age` seconds old into their day's
+        segment. Returns the number of files compacted; 0 if another compactor
+        holds the lock.
+        """
+        with open(os.path.join(self.archive_dir, '.lock'), 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+
+            cutoff = time.time() - min_age
+            by_day = {}
+            with os.scandir(self.processed_dir) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    mtime = entry.stat().st_mtime
+                    if mtime <= cutoff:
+                        by_day.setdefault(date.fromtimestamp(mtime), []).append((mtime, entry.name))
+
+            compacted = 0
+            with STAGE_SECONDS.time(stage='compact'):
+                for day, files in sorted(by_day.items()):
+                    files.sort()
+                    if limit is not None:
+                        files = files[:max(0, limit - compacted)]
+                    compacted += self._append(day, [name for _, name in files])
+                    if limit is not None and compacted >= limit:
+                        break
+        if compacted:
+            logger.info(f"Compacted {compacted} processed detection files into {self.archive_dir}")
+        return compacted
+
+    def _append(self, day, names):
+        if not names:
+            return 0
+        entries, index_end = self._read_index(day)
+        indexed = {(entry['name'], entry['size'], entry['mtime']) for entry in entries}
+        end = entries[-1]['offset'] + entries[-1]['length'] if entries else 0
+
+        with open(self.segment_path(day), 'ab') as segment, open(self.index_path(day), 'ab') as index:
+            # Drop anything left behind by a run that died before indexing it
+            if segment.tell() != end:
+                segment.truncate(end)
+                segment.seek(end)
+            if index.tell() != index_end:
+                index.truncate(index_end)
+                index.seek(index_end)
+
+            new_lines = []
+            done = []
+            member, block_size, block_entries = None, 0, []
+
+            def close_member():
+                nonlocal end, member, block_size
+                member.close()
+                length = segment.tell() - end
+                for entry in block_entries:
+                    new_lines.append(json.dumps({**entry, 'offset': end, 'length': length}).encode() + b'\n')
+                end += length
+                member, block_size = None, 0
+                block_entries.clear()
+
+            for name in names:
+                path = os.path.join(self.processed_dir, name)
+                try:
+                    f = open(path, 'rb')
+                except FileNotFoundError:
+                    continue
+                with f:
+                    st = os.fstat(f.fileno())
+                    if (name, st.st_size, st.st_mtime) in indexed:
+                        # Already compacted by a run that died before removing it
+                        done.append(path)
+                        continue
+                    if member is None:
+                        # filename='' keeps the segment's own name out of the member header
+                        member = gzip.GzipFile(
+                            filename='', mode='wb', fileobj=segment, compresslevel=self.compression_level, mtime=0
+                        )
+                    start = block_size
+                    while chunk := f.read(COPY_CHUNK):
+                        member.write(chunk)
+                        block_size += len(chunk)
+                block_entries.append({'name': name, 'start': start, 'size': block_size - start, 'mtime': st.st_mtime})
+                done.append(path)
+                if block_size >= self.block_bytes:
+                    close_member()
+            if member is not None:
+                close_member()
+
+            segment.flush()
+            os.fsync(segment.fileno())
+            index.writelines(new_lines)
+            index.flush()
+            os.fsync(index.fileno())
+
+        for path in done:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return len(done)
+
+    def fetch(self, name, day):
+        """
+        Original bytes of a processed file, whether it is still loose in
+        `processed/` or already compacted into the segment of `day` (the date
+        of its mtime). Raises FileNotFoundError if it is in neither.
+        """
+        try:
+            with open(os.path.join(self.processed_dir, name), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            pass
+
+        # A name archived more than once resolves to its latest copy
+        for entry in reversed(self.index(day)):
+            if entry['name'] == name:
+                return self.read_entry(day, entry)
+        raise FileNotFoundError(name)
+
+    def iter_files(self, day):
+        """(name, mtime, bytes) for every file in a day's segment, in the order they were compacted"""
+        with open(self.segment_path(day), 'rb') as segment:
+            offset, member = None, None
+            for entry in self.index(day):
+                if entry['offset'] != offset:
+                    offset = entry['offset']
+                    segment.seek(offset)
+                    member = gzip.GzipFile(fileobj=segment, mode='rb')
+                # Entries of a member are in order, so this only ever decompresses forward
+                member.seek(entry['start'])
+                yield entry['name'], entry['mtime'], member.read(entry['size'])
+
+    def read_entry(self, day, entry):
+        """Original bytes of the file behind one index entry"""
+        with open(self.segment_path(day), 'rb') as segment:
+            segment.seek(entry['offset'])
+            member = gzip.GzipFile(fileobj=segment, mode='rb')
+            member.seek(entry['start'])
+            return member.read(entry['size'])
+
+    def expire(self, retention_days):
+        """Delete segments older than `retention_days`; returns how many days were removed"""
+        oldest = date.today() - timedelta(days=retention_days)
+        removed = 0
+        for day in self.days():
+            if day >= oldest:
+                break
+            for path in (self.segment_path(day), self.index_path(day)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            removed += 1
+        if removed:
+            logger.info(f"Removed {removed} archived detection segments older than {retention_days} days")
+        return removed
+
+    def stats(self):
+        """Segment count and on-disk size of the archive, and what is still waiting to be compacted"""
+        segment_bytes = sum(
+            os.path.getsize(os.path.join(self.archive_dir, filename))
+            for filename in os.listdir(self.archive_dir)
+            if filename.endswith((SEGMENT_SUFFIX, INDEX_SUFFIX))
+        )
+        with os.scandir(self.processed_dir) as entries:
+            loose = [entry.stat().st_size for entry in entries if entry.is_file()]
+        return {
+            'segments': len(self.days()),
+            'segment_bytes': segment_bytes,
+            'loose_files': len(loose),
+            'loose_bytes': sum(loose),
+        }
@@ -0,0 +1,447 @@
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .identity_cache import truck_cache, equipment_cache
+from .manifest import manifest
+from .models import Truck, TruckEvent, SafetyEvent, Alert, Equipment, Dock
+from .watcher import LatencyStats
+from .workload import YardProfile, generate
+
+# Named database sizes for the benchmark suite, in truck events
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# Views timed by the benchmark suite, by URL name
+SUITE_VIEWS = [
+    'operations_dashboard', 'supervisor_dashboard',
+    'api_live_events', 'api_alerts', 'api_cv_detections', 'api_dashboard_stats',
+]
+
+
+@contextmanager
+def isolated_database(keep=False):
+    """
+    Run the block against a freshly migrated throwaway database so benchmarks
+    never touch real data. SQLite benchmarks use an on-disk file rather than the
+    default in-memory test database so that commit and fsync costs are counted.
+    """
+    connection = connections['default']
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    if connection.vendor == 'sqlite':
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+
+    # Cached primary keys and manifest entries from another database don't apply here
+    truck_cache.clear()
+    equipment_cache.clear()
+    manifest.reset()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keep)
+    try:
+        yield workdir
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keep)
+        shutil.rmtree(workdir, ignore_errors=True)
+        truck_cache.clear()
+        equipment_cache.clear()
+        manifest.reset()
+
+
+def make_documents(files, records_per_file, trucks=200, equipment=20, seed=0):
+    """Synthetic detection documents in the camera file schema"""
+    rng = random.Random(seed)
+    event_types = ['gate_in', 'docked', 'loading_start', 'loading_end', 'departed']
+    documents = []
+    for _ in range(files):
+        truck_detections, safety_violations, equipment_status = [], [], []
+        for _ in range(records_per_file):
+            kind = rng.random()
+            if kind < 0.8:
+                truck_detections.append({
+                    'truck_id': f'TRUCK_{rng.randrange(trucks):04d}',
+                    'event_type': rng.choice(event_types),
+                    'location': rng.choice(['Gate 1', 'Gate 2', 'Bay 1', 'Bay 2', 'Bay 3']),
+                    'license_plate': f'ABC{rng.randint(100, 999)}',
+                    'driver_name': 'Benchmark Driver',
+                    'company': 'Benchmark Logistics',
+                    'notes': 'Benchmark detection',
+                })
+            elif kind < 0.9:
+                safety_violations.append({
+                    'violation_type': rng.choice(['no_ppe', 'overspeed', 'zone_breach']),
+                    'severity': rng.choice(['low', 'medium', 'high', 'critical']),
+                    'location': 'Loading Zone A',
+                    'description': 'Benchmark violation',
+                })
+            else:
+                equipment_status.append({
+                    'equipment_id': f'EQ_{rng.randrange(equipment):03d}',
+                    'equipment_type': rng.choice(['forklift', 'crane', 'loader']),
+                    'status': rng.choice(['active', 'idle', 'maintenance']),
+                    'location': 'Main Yard',
+                })
+        documents.append({
+            'truck_detections': truck_detections,
+            'safety_violations': safety_violations,
+            'equipment_status': equipment_status,
+        })
+    return documents
+
+
+def write_documents(directory, documents, prefix='bench'):
+    """Drop documents into a detection directory the way a camera would"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index, document in enumerate(documents):
+        path = os.path.join(directory, f'{prefix}_{index:06d}.json')
+        with open(path, 'w') as f:
+            json.dump(document, f)
+        paths.append(path)
+    return paths
+
+
+def record_count(documents):
+    return sum(
+        len(document.get('truck_detections', []))
+        + len(document.get('safety_violations', []))
+        + len(document.get('equipment_status', []))
+        for document in documents
+    )
+
+
+def legacy_ingest(document):
+    """
+    The original one-record-at-a-time ingest (get_or_create, save and create per
+    record, each in autocommit), kept only as the baseline for comparisons.
+    """
+    status_map = {
+        'gate_in': 'gate_in',
+        'docked': 'docked',
+        'loading_start': 'loading',
+        'loading_end': 'loading',
+        'departed': 'departed'
+    }
+    for detection in document.get('truck_detections', []):
+        truck, _ = Truck.objects.get_or_create(
+            truck_id=detection.get('truck_id'),
+            defaults={
+                'license_plate': detection.get('license_plate', 'UNKNOWN'),
+                'driver_name': detection.get('driver_name', 'Unknown'),
+                'company': detection.get('company', 'Unknown'),
+                'current_status': 'gate_in'
+            }
+        )
+        if detection.get('event_type') in status_map:
+            truck.current_status = status_map[detection['event_type']]
+            truck.save()
+        TruckEvent.objects.create(
+            truck=truck,
+            event_type=detection.get('event_type'),
+            location=detection.get('location', 'Unknown'),
+            notes=detection.get('notes', 'Automated detection')
+        )
+
+    for violation in document.get('safety_violations', []):
+        SafetyEvent.objects.create(
+            violation_type=violation.get('violation_type', 'unsafe_operation'),
+            severity=violation.get('severity', 'medium'),
+            location=violation.get('location', 'Unknown'),
+            description=violation.get('description', 'Safety violation detected')
+        )
+        if violation.get('severity') in ['high', 'critical']:
+            Alert.objects.create(
+                alert_type='safety',
+                priority=violation.get('severity', 'medium'),
+                title=f"Safety Violation - {violation.get('violation_type', 'Unknown')}",
+                message=violation.get('description', 'Critical safety violation detected'),
+            )
+
+    for eq_data in document.get('equipment_status', []):
+        equipment, created = Equipment.objects.get_or_create(
+            equipment_id=eq_data.get('equipment_id'),
+            defaults={
+                'equipment_type': eq_data.get('equipment_type', 'forklift'),
+                'status': eq_data.get('status', 'idle'),
+                'current_location': eq_data.get('location', 'Unknown')
+            }
+        )
+        if not created:
+            equipment.status = eq_data.get('status', equipment.status)
+            equipment.current_location = eq_data.get('location', equipment.current_location)
+            equipment.save()
+        if eq_data.get('status') == 'maintenance':
+            Alert.objects.create(
+                alert_type='equipment',
+                priority='high',
+                title=f"Equipment Maintenance - {equipment.equipment_id}",
+                message=f"{equipment.equipment_type} requires maintenance",
+                related_equipment=equipment
+            )
+
+
+def bench_ingest(documents, mode, workdir, workers=4, interval=0.0):
+    """
+    Ingest `documents` in `mode` ('legacy', 'file', 'batch', 'pool', or the
+    end-to-end 'drop' and 'push', which also report hand-off to commit latency)
+    and return rows/sec.
+    """
+    from .detection_handler import DetectionProcessor
+    from .ingest_pool import IngestPool
+
+    if mode in ('drop', 'push'):
+        return _bench_end_to_end(documents, mode, workdir, workers, interval)
+
+    records = record_count(documents)
+    if mode == 'legacy':
+        started = time.perf_counter()
+        for document in documents:
+            legacy_ingest(document)
+        elapsed = time.perf_counter() - started
+    else:
+        json_dir = os.path.join(workdir, f'detections_{mode}')
+        processor = DetectionProcessor(json_dir=json_dir)
+        paths = write_documents(json_dir, documents)
+        started = time.perf_counter()
+        if mode == 'file':
+            for path in paths:
+                processor.process_detection_file(path)
+        elif mode == 'pool':
+            pool = IngestPool(processor, workers=workers, max_batch=processor.batch_max_files)
+            pool.start()
+            pool.submit(paths)
+            pool.join()
+            pool.stop()
+        else:
+            processor.process_new_detections()
+        elapsed = time.perf_counter() - started
+
+    return {
+        'mode': f'pool x{workers}' if mode == 'pool' else mode,
+        'files': len(documents),
+        'records': records,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(records / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def _bench_end_to_end(documents, mode, workdir, workers, interval):
+    from . import push_ingest
+    from .detection_handler import DetectionProcessor
+
+    json_dir = os.path.join(workdir, f'detections_{mode}')
+    processor = DetectionProcessor(json_dir=json_dir)
+
+    if mode == 'push':
+        ingester = push_ingest.PushIngester(processor, maxsize=len(documents) + 1)
+        push_ingest._push_ingester = ingester
+        client = Client()
+        bodies = [gzip.compress(json.dumps(document).encode()) for document in documents]
+        started = time.perf_counter()
+        with override_settings(DETECTION_PUSH_TOKENS=['benchmark']):
+            for body in bodies:
+                response = client.post(
+                    '/api/detections/', data=body, content_type='application/json',
+                    HTTP_CONTENT_ENCODING='gzip', HTTP_AUTHORIZATION='Bearer benchmark',
+                )
+                assert response.status_code == 202, response.content
+                time.sleep(interval)
+        ingester.join()
+        elapsed = time.perf_counter() - started
+        push_ingest._push_ingester = None
+        latency = ingester.latency.snapshot()
+    else:
+        processor.start_monitoring(workers=workers)
+        started = time.perf_counter()
+        for index, document in enumerate(documents):
+            # Write then rename, the way a camera should drop files
+            path = os.path.join(json_dir, f'drop_{index:06d}.json')
+            with open(path + '.tmp', 'w') as f:
+                json.dump(document, f)
+            os.rename(path + '.tmp', path)
+            time.sleep(interval)
+        while len(os.listdir(processor.processed_dir)) < len(documents):
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - started
+        processor.stop_monitoring()
+        latency = processor.pool.latency.snapshot()
+
+    records = record_count(documents)
+    return {
+        'mode': mode,
+        'files': len(documents),
+        'records': records,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(records / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': latency['p50_ms'],
+        'p95_ms': latency['p95_ms'],
+    }
+
+
+def populate(events, processes=1, seed=0):
+    """
+    Fill the current database with roughly `events` truck events of simulated
+    yard history ending now (about five events per truck visit), plus docks.
+    """
+    profile = YardProfile(trucks=max(200, events // 2000), arrivals_per_hour=60.0)
+    hours = events / 5 / profile.arrivals_per_hour
+    end = timezone.now()
+    generate(profile, end - timedelta(hours=hours), end, target='db', processes=processes, seed=seed)
+    Dock.objects.bulk_create(
+        [Dock(dock_id=f'D{index:02d}', location_x=index * 10.0, location_y=0.0) for index in range(1, profile.docks + 1)],
+        ignore_conflicts=True,
+    )
+
+
+def peak_memory(fn):
+    """Run `fn` under tracemalloc and return its peak Python heap use in KiB"""
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def bench_views(names, requests=50):
+    """
+    Latency percentiles, sustained requests/sec, query count and peak memory
+    of GET requests to each named view, as a superuser, against the current
+    database. The cache is cleared before each measured request, so these are
+    the costs of computing the view; cache hits are timed separately.
+    """
+    user, _ = User.objects.get_or_create(username='benchmark', defaults={'is_superuser': True, 'is_staff': True})
+    client = Client()
+    client.force_login(user)
+
+    results = {}
+    for name in names:
+        url = reverse(name)
+        # Warm up caches, template loading and the connection
+        response = client.get(url)
+        assert response.status_code == 200, f'{name} returned {response.status_code}'
+
+        stats = LatencyStats(window=requests)
+        elapsed = 0.0
+        for _ in range(requests):
+            cache.clear()
+            started = time.perf_counter()
+            client.get(url)
+            stats.add(time.perf_counter() - started)
+            elapsed += time.perf_counter() - started
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        # Read now: the next request resets the connection's query log
+        query_count = len(queries)
+        cache.clear()
+        peak_kb = peak_memory(lambda: client.get(url))
+
+        hits = LatencyStats(window=requests)
+        for _ in range(requests):
+            started = time.perf_counter()
+            client.get(url)
+            hits.add(time.perf_counter() - started)
+        hit = hits.snapshot()
+
+        result = stats.snapshot()
+        result['requests'] = result.pop('files')
+        result['requests_per_sec'] = round(requests / elapsed, 1) if elapsed else 0.0
+        result['queries'] = query_count
+        result['peak_kb'] = peak_kb
+        result['hit_p50_ms'] = hit['p50_ms']
+        result['hit_p95_ms'] = hit['p95_ms']
+        results[name] = result
+    return results
+
+
+def run_suite(scales, requests=50, processes=1, ingest_files=200, ingest_records=25, workers=4, log=None):
+    """
+    Run the benchmark suite at each named scale, each in its own throwaway
+    database: populate it, then measure ingest throughput on top of that
+    history and request latency of SUITE_VIEWS. Returns a JSON-serialisable dict.
+    """
+    log = log or (lambda message: None)
+    results = {
+        'started_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'scales': {},
+    }
+    # Query logging would otherwise grow without bound during long runs. A
+    # private cache: bench_views clears it, which mustn't empty a shared one
+    private_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmarks'}}
+    with override_settings(DEBUG=False, CACHES=private_cache):
+        for scale in scales:
+            events = SCALES[scale]
+            with isolated_database() as workdir:
+                log(f'{scale}: populating {events} events...')
+                started = time.perf_counter()
+                populate(events, processes=processes)
+                populated = round(time.perf_counter() - started, 1)
+
+                log(f'{scale}: ingest...')
+                documents = make_documents(ingest_files, ingest_records, seed=1)
+                ingest = {
+                    'batch': bench_ingest(documents, 'batch', workdir),
+                    'pool': bench_ingest(make_documents(ingest_files, ingest_records, seed=2), 'pool', workdir, workers=workers),
+                }
+                extra = make_documents(ingest_files, ingest_records, seed=3)
+                ingest['batch']['peak_kb'] = peak_memory(lambda: bench_ingest(extra, 'batch', os.path.join(workdir, 'memory')))
+
+                log(f'{scale}: views...')
+                views = bench_views(SUITE_VIEWS, requests=requests)
+
+            results['scales'][scale] = {
+                'events': events,
+                'populate_seconds': populated,
+                'ingest': ingest,
+                'views': views,
+            }
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Regressions of `results` against `baseline` beyond `tolerance` (a
+    fraction): slower view p95 or requests/sec, lower ingest throughput or
+    higher peak memory.
+    Returns human-readable lines; empty if nothing regressed.
+    """
+    regressions = []
+
+    def check(label, current, previous, higher_is_better=False):
+        if not previous or current is None:
+            return
+        change = (current - previous) / previous
+        if (-change if higher_is_better else change) > tolerance:
+            regressions.append(f'{label}: {previous} -> {current} ({change:+.0%})')
+
+    for scale, current in results['scales'].items():
+        previous = baseline.get('scales', {}).get(scale)
+        if not previous:
+            continue
+        for mode, result in current['ingest'].items():
+            before = previous['ingest'].get(mode, {})
+            check(f'{scale} ingest {mode} rows/sec', result['rows_per_sec'], before.get('rows_per_sec'), higher_is_better=True)
+            check(f'{scale} ingest {mode} peak KiB', result.get('peak_kb'), before.get('peak_kb'))
+        for name, result in current['views'].items():
+            before = previous['views'].get(name, {})
+            check(f'{scale} {name} p95 ms', result['p95_ms'], before.get('p95_ms'))
+            check(f'{scale} {name} cache hit p95 ms', result.get('hit_p95_ms'), before.get('hit_p95_ms'))
+            check(f'{scale} {name} requests/sec', result.get('requests_per_sec'), before.get('requests_per_sec'), higher_is_better=True)
+            check(f'{scale} {name} queries', result['queries'], before.get('queries'))
+            check(f'{scale} {name} peak KiB', result['peak_kb'], before.get('peak_kb'))
+    return regressions
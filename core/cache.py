@@ -0,0 +1,65 @@
+import hashlib
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import versions
+
+KEY_PREFIX = 'core:view'
+
+# Striped locks: requests in one process computing the same entry queue up
+# behind the first instead of all recomputing it
+_locks = [threading.Lock() for _ in range(64)]
+
+
+def _local_lock(key):
+    return _locks[zlib.crc32(key.encode()) % len(_locks)]
+
+
+def cache_key(name, models, request=None, parts=()):
+    """Key of a cached result: its name, the data versions of `models` and any other `parts` it depends on"""
+    current, _ = versions.for_request(request, *models) if request is not None else versions.current(*models)
+    key = ':'.join([KEY_PREFIX, name, *(str(version) for version in current.values())])
+    if parts:
+        # Parts may come from query parameters: hashed, so any value makes a valid key
+        key += ':' + hashlib.sha1(repr(parts).encode()).hexdigest()
+    return key
+
+
+def cached(name, models, compute, request=None, parts=()):
+    """
+    The result of `compute()`, cached under the data versions of `models` and
+    any other `parts` it depends on. A miss is computed once, while other
+    requests wait up to VIEW_CACHE_WAIT for it.
+    """
+    key = cache_key(name, models, request, parts)
+    entry = cache.get(key)
+    if entry is not None:
+        return entry[0]
+
+    with _local_lock(key):
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+
+        lock_key = f'{key}:lock'
+        wait = getattr(settings, 'VIEW_CACHE_WAIT', 2.0)
+        locked = cache.add(lock_key, True, wait + 1)
+        if not locked:
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline:
+                time.sleep(0.02)
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry[0]
+        try:
+            value = compute()
+            # Wrapped, so a cached None is still a hit
+            cache.set(key, (value,), getattr(settings, 'VIEW_CACHE_TIMEOUT', 300))
+        finally:
+            if locked:
+                cache.delete(lock_key)
+        return value
@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from .roles import Roles, user_roles
+
+
+def roles(request):
+    """The user's dashboard roles as `roles`, resolved only if a template uses them"""
+    return {'roles': SimpleLazyObject(lambda: Roles(user_roles(request.user)))}
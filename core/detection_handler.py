@@ -1,195 +1,657 @@
 import json
 import os
 import time
-import threading
+from datetime import datetime
 from django.conf import settings
+from contextlib import nullcontext
+from django.db import transaction
 from django.utils import timezone
-from .models import Truck, TruckEvent, SafetyEvent, Alert, Equipment
+from .models import Truck, TruckEvent, SafetyEvent, Alert, Equipment, IngestCheckpoint
+from .identity_cache import truck_cache, equipment_cache
+from .manifest import manifest, content_digest
+from .metrics import STAGE_SECONDS, FILES, RECORDS, DUPLICATES, ERRORS, COMMIT_LAG, ingest_log
+from . import safety_counters, rollups, versions
+from .ingest_pool import IngestPool, SECTIONS
+from .watcher import DetectionWatcher
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Truck status implied by each detection event type
+TRUCK_STATUS_MAP = {
+    'gate_in': 'gate_in',
+    'docked': 'docked',
+    'loading_start': 'loading',
+    'loading_end': 'loading',
+    'departed': 'departed',
+}
+
+# Record `type` values in newline-delimited files and the document section each belongs to
+NDJSON_RECORD_TYPES = {
+    'truck_detection': 'truck_detections',
+    'safety_violation': 'safety_violations',
+    'equipment_status': 'equipment_status',
+}
+
+# Source of generate_yard_workload's detection files. Their records are
+# simulated history, so each keeps its own `timestamp` instead of the ingest time
+SIMULATOR_SOURCE = 'simulator'
+
+# Models an ingested record count (see _empty_counts) may have written, whose
+# data versions are bumped when it is non-zero
+WRITTEN_MODELS = {
+    'trucks': (Truck, TruckEvent),
+    'safety': (SafetyEvent, Alert),
+    'equipment': (Equipment, Alert),
+}
+
 class DetectionProcessor:
-    def __init__(self):
-        self.json_dir = settings.JSON_DETECTIONS_DIR
+    def __init__(self, json_dir=None):
+        self.json_dir = str(json_dir or settings.JSON_DETECTIONS_DIR)
         self.processed_dir = os.path.join(self.json_dir, 'processed')
+        self.batch_max_files = getattr(settings, 'DETECTION_BATCH_MAX_FILES', 200)
+        self.ndjson_chunk_lines = getattr(settings, 'DETECTION_NDJSON_CHUNK_LINES', 1000)
         self.running = False
-        self.monitor_thread = None
+        self.watcher = None
+        self.pool = None
         
         # Create directories if they don't exist
         os.makedirs(self.json_dir, exist_ok=True)
         os.makedirs(self.processed_dir, exist_ok=True)
     
-    def start_monitoring(self):
+    def start_monitoring(self, workers=None):
         """Start continuous monitoring of detection files"""
         self.running = True
-        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
-        self.monitor_thread.start()
+        self.pool = IngestPool(
+            self,
+            workers=workers or getattr(settings, 'DETECTION_INGEST_WORKERS', 4),
+            max_batch=self.batch_max_files,
+        )
+        self.pool.start()
+        self.watcher = DetectionWatcher(
+            self.json_dir,
+            self.pool.submit,
+            accept=self.is_detection_file,
+            batch_size=self.batch_max_files,
+            mode=getattr(settings, 'DETECTION_WATCH_MODE', 'auto'),
+            poll_interval=getattr(settings, 'DETECTION_WATCH_POLL_INTERVAL', 0.25),
+            settle_time=getattr(settings, 'DETECTION_WATCH_SETTLE_TIME', 0.05),
+        )
+        self.watcher.start()
         logger.info("Started real-time detection monitoring")
     
     def stop_monitoring(self):
         """Stop monitoring"""
         self.running = False
-        if self.monitor_thread:
-            self.monitor_thread.join(timeout=5)
+        if self.watcher:
+            self.watcher.stop()
+        if self.pool:
+            self.pool.stop()
         logger.info("Stopped real-time detection monitoring")
     
-    def _monitor_loop(self):
-        """Main monitoring loop"""
-        while self.running:
-            try:
-                self.process_new_detections()
-                time.sleep(2)  # Check every 2 seconds
-            except Exception as e:
-                logger.error(f"Error in monitoring loop: {str(e)}")
-                time.sleep(5)
+    def watcher_stats(self):
+        """Pickup-latency statistics from the file watcher"""
+        return self.watcher.stats() if self.watcher else {}
+    
+    def backlog(self):
+        """Detection files waiting to be ingested and how far behind the oldest one is"""
+        now = time.time()
+        pending = 0
+        oldest = None
+        with os.scandir(self.json_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and self.is_detection_file(entry.name):
+                    pending += 1
+                    mtime = entry.stat().st_mtime
+                    oldest = mtime if oldest is None else min(oldest, mtime)
+        return {
+            'pending_files': pending,
+            'queued_shards': self.pool.backlog() if self.pool else 0,
+            'lag_seconds': round(now - oldest, 3) if oldest is not None else 0.0,
+        }
+    
+    @staticmethod
+    def is_detection_file(filename):
+        """Whether a file in the detections directory should be ingested"""
+        return filename.endswith(('.json', '.ndjson')) and not filename.startswith('processed_')
     
     def process_new_detections(self):
         """Process any new detection files"""
         try:
-            for filename in os.listdir(self.json_dir):
-                if filename.endswith('.json') and not filename.startswith('processed_'):
-                    file_path = os.path.join(self.json_dir, filename)
-                    self.process_detection_file(file_path)
+            with STAGE_SECONDS.time(stage='scan'):
+                file_paths = [
+                    os.path.join(self.json_dir, filename)
+                    for filename in sorted(os.listdir(self.json_dir))
+                    if self.is_detection_file(filename)
+                ]
+            for start in range(0, len(file_paths), self.batch_max_files):
+                self.process_detection_batch(file_paths[start:start + self.batch_max_files])
         except Exception as e:
             logger.error(f"Error processing detection files: {str(e)}")
     
     def process_detection_file(self, file_path):
         """Process a single detection file"""
+        self.process_detection_batch([file_path])
+    
+    def process_detection_batch(self, file_paths):
+        """Process several detection files in a single transaction and archive them"""
+        documents = []
+        for file_path in file_paths:
+            if file_path.endswith('.ndjson'):
+                self.process_ndjson_file(file_path)
+                continue
+            try:
+                with STAGE_SECONDS.time(stage='parse'):
+                    with open(file_path, 'rb') as f:
+                        written_at = os.fstat(f.fileno()).st_mtime
+                        raw = f.read()
+                    documents.append((file_path, content_digest(raw), json.loads(raw), written_at))
+            except Exception as e:
+                logger.error(f"Error processing detection file {file_path}: {str(e)}")
+                ERRORS.inc(stage='parse')
+                self._move_to_error(file_path)
+        
+        if not documents:
+            return
+        
         try:
-            with open(file_path, 'r') as f:
-                detection_data = json.load(f)
-            
-            logger.info(f"Processing detection file: {file_path}")
-            
-            # Process different types of detections
-            if 'truck_detections' in detection_data:
-                self._process_truck_detections(detection_data['truck_detections'])
-            
-            if 'safety_violations' in detection_data:
-                self._process_safety_violations(detection_data['safety_violations'])
-            
-            if 'equipment_status' in detection_data:
-                self._process_equipment_status(detection_data['equipment_status'])
-            
-            # Move processed file to archive
-            processed_filename = f"processed_{os.path.basename(file_path)}"
-            archive_path = os.path.join(self.processed_dir, processed_filename)
-            os.rename(file_path, archive_path)
+            counts = self.ingest_documents(
+                [data for _, _, data, _ in documents],
+                keys=[digest for _, digest, _, _ in documents],
+                written_at=[written_at for _, _, _, written_at in documents],
+            )
+        except Exception as e:
+            # One bad file or record must not hold back the rest of the batch
+            logger.error(f"Batch of {len(documents)} files failed, retrying individually: {str(e)}")
+            ERRORS.inc(stage='db_write')
+            counts = self._empty_counts()
+            for _, digest, data, written_at in documents:
+                for key, count in self._ingest_with_fallback(data, digest, written_at).items():
+                    counts[key] += count
+        
+        for file_path, _, _, _ in documents:
+            self._archive(file_path)
+        
+        logger.debug(f"Processed {len(documents)} detection files: {counts}")
+        ingest_log.add(files=len(documents), **counts)
+    
+    def process_ndjson_file(self, file_path, lock=None):
+        """
+        Stream a newline-delimited detection file. Each line is either a record
+        with a `type` of truck_detection, safety_violation or equipment_status,
+        or a whole document in the regular file schema. Lines are read
+        incrementally and committed every `ndjson_chunk_lines` lines together
+        with the byte offset reached, so memory stays flat and a restart resumes
+        after the last committed chunk instead of re-reading the file.
+        """
+        file_name = os.path.basename(file_path)
+        
+        # Hashing a huge file up front would mean reading it twice, so streamed
+        # files are identified by name, size and mtime (all kept by the archive rename)
+        st = os.stat(file_path)
+        file_key = content_digest(f"{file_name}:{st.st_size}:{st.st_mtime_ns}")
+        if manifest.seen([file_key]):
+            logger.info(f"Skipping already ingested file {file_name}")
+            DUPLICATES.inc()
+            self._archive(file_path)
+            return
+        
+        checkpoint = IngestCheckpoint.objects.filter(file_name=file_name).first()
+        offset = checkpoint.offset if checkpoint else 0
+        if offset:
+            logger.info(f"Resuming {file_name} at byte {offset}")
+        
+        skipped = 0
+        try:
+            with open(file_path, 'rb') as f:
+                f.seek(offset)
+                chunk, lines, started = self._empty_document(), 0, time.perf_counter()
+                while True:
+                    line = f.readline()
+                    if not line:
+                        break
+                    offset += len(line)
+                    if not self._add_ndjson_line(chunk, line, file_name):
+                        skipped += 1
+                    lines += 1
+                    if lines >= self.ndjson_chunk_lines:
+                        STAGE_SECONDS.observe(time.perf_counter() - started, stage='parse')
+                        self._commit_chunk(file_name, chunk, offset, lock, written_at=st.st_mtime)
+                        chunk, lines, started = self._empty_document(), 0, time.perf_counter()
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage='parse')
+                # The last chunk also records the file in the manifest
+                self._commit_chunk(file_name, chunk, offset, lock, final_key=file_key, written_at=st.st_mtime)
+        except OSError as e:
+            logger.error(f"Error processing detection file {file_path}: {str(e)}")
+            ERRORS.inc(stage='parse')
+            self._move_to_error(file_path)
+            return
+        
+        self._archive(file_path)
+        if skipped:
+            logger.warning(f"Skipped {skipped} malformed lines in {file_name}")
+            ERRORS.inc(skipped, stage='parse')
+        logger.debug(f"Processed streamed detection file {file_name} ({offset} bytes)")
+        ingest_log.add(files=1)
+    
+    @staticmethod
+    def _empty_document():
+        return {section: [] for section in SECTIONS}
+    
+    @staticmethod
+    def _add_ndjson_line(chunk, line, file_name):
+        """Parse one NDJSON line into the chunk being built; False if the line had to be skipped"""
+        line = line.strip()
+        if not line:
+            return True
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            logger.debug(f"Skipping malformed line in {file_name}: {str(e)}")
+            return False
+        
+        if not isinstance(record, dict):
+            logger.debug(f"Skipping non-object line in {file_name}")
+            return False
+        if any(section in record for section in SECTIONS):
+            for section in SECTIONS:
+                chunk[section].extend(record.get(section) or [])
+        elif record.get('type') in NDJSON_RECORD_TYPES:
+            chunk[NDJSON_RECORD_TYPES[record.pop('type')]].append(record)
+        else:
+            logger.debug(f"Skipping line with unknown record type {record.get('type')!r} in {file_name}")
+            return False
+        return True
+    
+    def _commit_chunk(self, file_name, chunk, offset, lock=None, final_key=None, written_at=None):
+        """Write a chunk of streamed records and its resume offset in one transaction"""
+        with lock or nullcontext():
+            try:
+                with transaction.atomic():
+                    self.ingest_documents([chunk], written_at=[written_at])
+                    self._save_progress(file_name, offset, final_key)
+            except Exception as e:
+                logger.error(f"Chunk of {file_name} failed, retrying record by record: {str(e)}")
+                ERRORS.inc(stage='db_write')
+                self._ingest_with_fallback(chunk, written_at=written_at)
+                with transaction.atomic():
+                    self._save_progress(file_name, offset, final_key)
+    
+    @staticmethod
+    def _save_progress(file_name, offset, final_key=None):
+        """Store the resume offset of a streamed file, or mark it done once it is complete"""
+        if final_key:
+            manifest.claim([final_key])
+            IngestCheckpoint.objects.filter(file_name=file_name).delete()
+        else:
+            IngestCheckpoint.objects.update_or_create(file_name=file_name, defaults={'offset': offset})
+    
+    @staticmethod
+    def _empty_counts():
+        return {'trucks': 0, 'safety': 0, 'equipment': 0, 'duplicates': 0}
+    
+    def ingest_documents(self, documents, keys=None, written_at=None):
+        """
+        Write the records of one or more detection documents in a single
+        transaction. `keys` optionally gives a manifest key per document (e.g.
+        the file's content hash); documents whose key was already ingested, and
+        records whose `detection_id` was, are skipped as duplicates.
+        `written_at` optionally gives a fallback detection time per document
+        (e.g. the file's mtime) for documents without a `timestamp`.
+        """
+        counts = self._empty_counts()
+        started = time.perf_counter()
+        detected_at = self._detection_times(documents, written_at)
+        with transaction.atomic():
+            if keys:
+                fresh = manifest.claim(keys)
+                kept, kept_times = [], []
+                for data, key, detected in zip(documents, keys, detected_at):
+                    if key in fresh:
+                        fresh.discard(key)
+                        kept.append(data)
+                        kept_times.append(detected)
+                    else:
+                        counts['duplicates'] += 1
+                documents, detected_at = kept, kept_times
             
-            logger.info(f"Successfully processed: {file_path}")
+            sections = {section: [] for section in SECTIONS}
+            recorded = {}
+            for data in documents:
+                for section in SECTIONS:
+                    records = data.get(section) or []
+                    sections[section].extend(records)
+                    if data.get('source') == SIMULATOR_SOURCE:
+                        recorded.update(self._record_times(records))
+            counts['duplicates'] += self._drop_seen_records(sections)
             
+            counts['trucks'] = self._process_truck_detections(sections['truck_detections'], recorded)
+            counts['safety'] = self._process_safety_violations(sections['safety_violations'], recorded)
+            counts['equipment'] = self._process_equipment_status(sections['equipment_status'], recorded)
+            # Last, so the version rows are locked only until the commit
+            versions.bump(*(model for section, models in WRITTEN_MODELS.items() if counts[section] for model in models))
+            transaction.on_commit(lambda: self._record_commit(counts, detected_at))
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage='db_write')
+        return counts
+    
+    @staticmethod
+    def _detection_times(documents, written_at=None):
+        """Epoch detection time per document: its `timestamp` if it has one, else the fallback"""
+        times = []
+        for index, data in enumerate(documents):
+            detected = written_at[index] if written_at else None
+            timestamp = data.get('timestamp') if isinstance(data, dict) else None
+            if isinstance(timestamp, str):
+                try:
+                    # Naive timestamps are the camera host's local time
+                    detected = datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+                except ValueError:
+                    pass
+            times.append(detected)
+        return times
+    
+    @staticmethod
+    def _record_times(records):
+        """{id(record): aware datetime} of the records with a valid `timestamp`"""
+        times = {}
+        for record in records:
+            timestamp = record.get('timestamp') if isinstance(record, dict) else None
+            if not isinstance(timestamp, str):
+                continue
+            try:
+                moment = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            except ValueError:
+                continue
+            times[id(record)] = timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+        return times
+    
+    @staticmethod
+    def _record_commit(counts, detected_at):
+        """Update the ingest metrics once a write has committed"""
+        RECORDS.inc(counts['trucks'], type='truck')
+        RECORDS.inc(counts['safety'], type='safety')
+        RECORDS.inc(counts['equipment'], type='equipment')
+        if counts['duplicates']:
+            DUPLICATES.inc(counts['duplicates'])
+        now = time.time()
+        for detected in detected_at:
+            if detected is not None:
+                COMMIT_LAG.observe(max(0.0, now - detected))
+    
+    @staticmethod
+    def _drop_seen_records(sections):
+        """Remove records whose `detection_id` has been ingested before; returns how many were dropped"""
+        record_keys = {
+            id(record): content_digest(f"detection:{record['detection_id']}")
+            for records in sections.values()
+            for record in records
+            if isinstance(record, dict) and record.get('detection_id')
+        }
+        if not record_keys:
+            return 0
+        
+        fresh = manifest.claim(record_keys.values())
+        dropped = 0
+        for section, records in sections.items():
+            kept = []
+            for record in records:
+                key = record_keys.get(id(record))
+                if key is None or key in fresh:
+                    fresh.discard(key)
+                    kept.append(record)
+                else:
+                    dropped += 1
+            sections[section] = kept
+        return dropped
+    
+    def _ingest_with_fallback(self, data, key=None, written_at=None, rejected=None):
+        """
+        Ingest one document, falling back to one record per transaction if the
+        bulk write fails. Records that can't be written are dropped, or added
+        to `rejected` ({section: [records]}) if given.
+        """
+        try:
+            return self.ingest_documents([data], keys=[key] if key else None, written_at=[written_at])
         except Exception as e:
-            logger.error(f"Error processing detection file {file_path}: {str(e)}")
-            # Move problematic file to error directory
-            error_dir = os.path.join(self.json_dir, 'error')
-            os.makedirs(error_dir, exist_ok=True)
-            error_path = os.path.join(error_dir, f"error_{os.path.basename(file_path)}")
+            logger.error(f"Bulk ingest failed, retrying record by record: {str(e)}")
+        
+        counts = self._empty_counts()
+        failed = 0
+        for section in SECTIONS:
+            for record in data.get(section) or []:
+                try:
+                    single = {'source': data.get('source'), section: [record]}
+                    for name, count in self.ingest_documents([single]).items():
+                        counts[name] += count
+                except Exception as e:
+                    failed += 1
+                    logger.debug(f"Error processing {section} record: {str(e)}")
+                    if rejected is not None:
+                        rejected.setdefault(section, []).append(record)
+        if failed:
+            if rejected is None:
+                logger.error(f"Dropped {failed} records that could not be ingested")
+            ERRORS.inc(failed, stage='record')
+        if key:
+            with transaction.atomic():
+                manifest.claim([key])
+        return counts
+    
+    def _archive(self, file_path):
+        """Move a processed file into the archive"""
+        processed_filename = f"processed_{os.path.basename(file_path)}"
+        with STAGE_SECONDS.time(stage='archive'):
+            os.rename(file_path, os.path.join(self.processed_dir, processed_filename))
+        FILES.inc(result='archived')
+    
+    def _move_to_error(self, file_path):
+        """Move a problematic file to the error directory"""
+        error_dir = os.path.join(self.json_dir, 'error')
+        os.makedirs(error_dir, exist_ok=True)
+        error_path = os.path.join(error_dir, f"error_{os.path.basename(file_path)}")
+        try:
             os.rename(file_path, error_path)
+        except FileNotFoundError:
+            return
+        FILES.inc(result='error')
+    
+    @staticmethod
+    def _with_key(records, key, label):
+        """Drop records that are missing their natural key"""
+        valid = [record for record in records if record.get(key)]
+        if len(valid) < len(records):
+            logger.error(f"Skipped {len(records) - len(valid)} {label} records missing {key}")
+            ERRORS.inc(len(records) - len(valid), stage='record')
+        return valid
     
-    def _process_truck_detections(self, detections):
-        """Process truck movement and status detections"""
+    @staticmethod
+    def _resolve(model, key_field, defaults):
+        """
+        Fetch instances for the given natural keys with one IN lookup, bulk
+        creating any that do not exist yet. `defaults` maps each key to the
+        field values used if it has to be created. Returns the instances by key
+        and the set of keys that were created here.
+        """
+        found = model.objects.in_bulk(list(defaults), field_name=key_field)
+        missing = [key for key in defaults if key not in found]
+        if missing:
+            model.objects.bulk_create(
+                [model(**{key_field: key}, **defaults[key]) for key in missing],
+                ignore_conflicts=True,
+            )
+            found.update(model.objects.in_bulk(missing, field_name=key_field))
+        return found, set(missing)
+    
+    def _process_truck_detections(self, detections, recorded=None):
+        """
+        Process truck movement and status detections. `recorded` gives the
+        time of records that keep their own (by id); the rest are stamped now.
+        """
+        recorded = recorded or {}
+        detections = self._with_key(detections, 'truck_id', 'truck detection')
+        if not detections:
+            return 0
+        
+        defaults = {}
         for detection in detections:
-            try:
-                truck_id = detection.get('truck_id')
-                event_type = detection.get('event_type')
-                location = detection.get('location', 'Unknown')
-                
-                # Get or create truck
-                truck, created = Truck.objects.get_or_create(
-                    truck_id=truck_id,
-                    defaults={
-                        'license_plate': detection.get('license_plate', 'UNKNOWN'),
-                        'driver_name': detection.get('driver_name', 'Unknown'),
-                        'company': detection.get('company', 'Unknown'),
-                        'current_status': 'gate_in'
-                    }
-                )
-                
-                # Update truck status based on event
-                status_map = {
-                    'gate_in': 'gate_in',
-                    'docked': 'docked', 
-                    'loading_start': 'loading',
-                    'loading_end': 'loading',
-                    'departed': 'departed'
-                }
-                
-                if event_type in status_map:
-                    truck.current_status = status_map[event_type]
-                    truck.save()
-                
-                # Create event
-                TruckEvent.objects.create(
-                    truck=truck,
-                    event_type=event_type,
-                    location=location,
-                    notes=detection.get('notes', 'Automated detection')
-                )
-                
-                logger.info(f"Processed truck event: {truck_id} - {event_type}")
-                
-            except Exception as e:
-                logger.error(f"Error processing truck detection: {str(e)}")
+            defaults.setdefault(detection['truck_id'], {
+                'license_plate': detection.get('license_plate', 'UNKNOWN'),
+                'driver_name': detection.get('driver_name', 'Unknown'),
+                'company': detection.get('company', 'Unknown'),
+                'current_status': 'gate_in'
+            })
+        known, created = self._lookup_identities(Truck, 'truck_id', truck_cache, defaults, ['current_status'])
+        
+        status = {truck_id: values['current_status'] for truck_id, values in known.items()}
+        events = []
+        for detection in detections:
+            truck_id = detection['truck_id']
+            event_type = detection.get('event_type')
+            
+            # Update truck status based on event
+            if event_type in TRUCK_STATUS_MAP:
+                status[truck_id] = TRUCK_STATUS_MAP[event_type]
+            
+            event = TruckEvent(
+                truck_id=known[truck_id]['pk'],
+                event_type=event_type,
+                location=detection.get('location', 'Unknown'),
+                notes=detection.get('notes', 'Automated detection')
+            )
+            event.timestamp = recorded.get(id(detection), event.timestamp)
+            events.append(event)
+        
+        # Only trucks whose status actually ended up different need a write
+        changed = [
+            Truck(pk=known[truck_id]['pk'], current_status=new_status)
+            for truck_id, new_status in status.items()
+            if new_status != known[truck_id]['current_status']
+        ]
+        if changed:
+            Truck.objects.bulk_update(changed, ['current_status'])
+        TruckEvent.objects.bulk_create(events)
+        rollups.record(events)
+        
+        self._remember_identities(truck_cache, {
+            truck_id: {'pk': values['pk'], 'current_status': status[truck_id]}
+            for truck_id, values in known.items()
+        }, changed or created)
+        return len(events)
     
-    def _process_safety_violations(self, violations):
-        """Process safety violation detections"""
+    def _process_safety_violations(self, violations, recorded=None):
+        """Process safety violation detections, timed like _process_truck_detections"""
+        recorded = recorded or {}
+        events = []
+        alerts = []
         for violation in violations:
-            try:
-                safety_event = SafetyEvent.objects.create(
-                    violation_type=violation.get('violation_type', 'unsafe_operation'),
-                    severity=violation.get('severity', 'medium'),
-                    location=violation.get('location', 'Unknown'),
-                    description=violation.get('description', 'Safety violation detected')
-                )
-                
-                # Create alert for safety violations
-                if violation.get('severity') in ['high', 'critical']:
-                    Alert.objects.create(
-                        alert_type='safety',
-                        priority=violation.get('severity', 'medium'),
-                        title=f"Safety Violation - {violation.get('violation_type', 'Unknown')}",
-                        message=violation.get('description', 'Critical safety violation detected'),
-                    )
-                
-                logger.info(f"Processed safety violation: {safety_event.violation_type}")
-                
-            except Exception as e:
-                logger.error(f"Error processing safety violation: {str(e)}")
+            event = SafetyEvent(
+                violation_type=violation.get('violation_type', 'unsafe_operation'),
+                severity=violation.get('severity', 'medium'),
+                location=violation.get('location', 'Unknown'),
+                description=violation.get('description', 'Safety violation detected')
+            )
+            event.timestamp = recorded.get(id(violation), event.timestamp)
+            events.append(event)
+            
+            # Create alert for safety violations
+            if violation.get('severity') in ['high', 'critical']:
+                alerts.append(Alert(
+                    alert_type='safety',
+                    priority=violation.get('severity', 'medium'),
+                    title=f"Safety Violation - {violation.get('violation_type', 'Unknown')}",
+                    message=violation.get('description', 'Critical safety violation detected'),
+                    timestamp=event.timestamp,
+                ))
+        
+        SafetyEvent.objects.bulk_create(events)
+        safety_counters.record(events)
+        rollups.record(events)
+        Alert.objects.bulk_create(alerts)
+        return len(events)
     
-    def _process_equipment_status(self, equipment_data):
-        """Process equipment status updates"""
+    def _process_equipment_status(self, equipment_data, recorded=None):
+        """Process equipment status updates, timed like _process_truck_detections"""
+        recorded = recorded or {}
+        equipment_data = self._with_key(equipment_data, 'equipment_id', 'equipment status')
+        if not equipment_data:
+            return 0
+        
+        defaults = {}
         for eq_data in equipment_data:
-            try:
-                equipment, created = Equipment.objects.get_or_create(
-                    equipment_id=eq_data.get('equipment_id'),
-                    defaults={
-                        'equipment_type': eq_data.get('equipment_type', 'forklift'),
-                        'status': eq_data.get('status', 'idle'),
-                        'current_location': eq_data.get('location', 'Unknown')
-                    }
-                )
-                
-                if not created:
-                    equipment.status = eq_data.get('status', equipment.status)
-                    equipment.current_location = eq_data.get('location', equipment.current_location)
-                    equipment.save()
-                
-                # Create alert for equipment issues
-                if eq_data.get('status') == 'maintenance':
-                    Alert.objects.create(
-                        alert_type='equipment',
-                        priority='high',
-                        title=f"Equipment Maintenance - {equipment.equipment_id}",
-                        message=f"{equipment.equipment_type} requires maintenance",
-                        related_equipment=equipment
-                    )
-                
-                logger.info(f"Processed equipment status: {equipment.equipment_id} - {equipment.status}")
-                
-            except Exception as e:
-                logger.error(f"Error processing equipment status: {str(e)}")
-
+            defaults.setdefault(eq_data['equipment_id'], {
+                'equipment_type': eq_data.get('equipment_type', 'forklift'),
+                'status': eq_data.get('status', 'idle'),
+                'current_location': eq_data.get('location', 'Unknown')
+            })
+        known, created = self._lookup_identities(
+            Equipment, 'equipment_id', equipment_cache, defaults,
+            ['equipment_type', 'status', 'current_location']
+        )
+        
+        current = {equipment_id: dict(values) for equipment_id, values in known.items()}
+        first_record = set(created)
+        alerts = []
+        for eq_data in equipment_data:
+            equipment_id = eq_data['equipment_id']
+            item = current[equipment_id]
+            if equipment_id in first_record:
+                # The first record for a new item already supplied its values
+                first_record.discard(equipment_id)
+            else:
+                item['status'] = eq_data.get('status', item['status'])
+                item['current_location'] = eq_data.get('location', item['current_location'])
+            
+            # Create alert for equipment issues
+            if eq_data.get('status') == 'maintenance':
+                alerts.append(Alert(
+                    alert_type='equipment',
+                    priority='high',
+                    title=f"Equipment Maintenance - {equipment_id}",
+                    message=f"{item['equipment_type']} requires maintenance",
+                    related_equipment_id=item['pk'],
+                    timestamp=recorded.get(id(eq_data)) or timezone.now(),
+                ))
+        
+        # Only equipment whose status or location actually changed needs a write
+        changed = [
+            Equipment(pk=item['pk'], status=item['status'], current_location=item['current_location'])
+            for equipment_id, item in current.items()
+            if (item['status'], item['current_location'])
+            != (known[equipment_id]['status'], known[equipment_id]['current_location'])
+        ]
+        if changed:
+            Equipment.objects.bulk_update(changed, ['status', 'current_location'])
+        Alert.objects.bulk_create(alerts)
+        
+        self._remember_identities(equipment_cache, current, changed or created)
+        return len(equipment_data)
+    
+    def _lookup_identities(self, model, key_field, cache, defaults, fields):
+        """
+        Primary key and `fields` for each natural key in `defaults`, served from
+        the identity cache where possible; the rest are fetched (or created)
+        with a single IN lookup. Returns the values by key and the set of keys
+        that were created here.
+        """
+        cache.sync()
+        known = cache.get_many(defaults)
+        missing = {key: values for key, values in defaults.items() if key not in known}
+        created = set()
+        if missing:
+            instances, created = self._resolve(model, key_field, missing)
+            for key, instance in instances.items():
+                known[key] = {'pk': instance.pk, **{field: getattr(instance, field) for field in fields}}
+        return known, created
+    
+    @staticmethod
+    def _remember_identities(cache, values, changed):
+        """Update the identity cache once the surrounding transaction commits"""
+        def remember():
+            cache.put_many(values)
+            if changed:
+                cache.bump()
+        transaction.on_commit(remember)
+    
     def monitor_detection_files(self):
         """Legacy method for backward compatibility"""
         self.process_new_detections()
@@ -0,0 +1,88 @@
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class IdentityCache:
+    """
+    Bounded LRU map from a natural key (truck_id, equipment_id) to the row's
+    primary key and compared fields, written after commit and dropped when
+    another process touches the shared epoch file.
+    """
+
+    def __init__(self, name, maxsize=4096):
+        self.name = name
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.epoch = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def epoch_path(self):
+        return os.path.join(str(settings.JSON_DETECTIONS_DIR), f'.{self.name}_identity_epoch')
+
+    def get_many(self, keys):
+        """Cached values for whichever of `keys` are present"""
+        found = {}
+        with self.lock:
+            for key in keys:
+                value = self.entries.get(key)
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.entries.move_to_end(key)
+                    found[key] = value
+                    self.hits += 1
+        return found
+
+    def put_many(self, values):
+        with self.lock:
+            for key, value in values.items():
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def sync(self):
+        """Drop everything if another process has changed these rows since the last check"""
+        epoch = self._read_epoch()
+        if epoch != self.epoch:
+            self.clear()
+            self.epoch = epoch
+
+    def bump(self):
+        """Tell other processes that rows behind this cache changed"""
+        path = self.epoch_path
+        try:
+            with open(path, 'a'):
+                os.utime(path)
+        except OSError:
+            return
+        self.epoch = self._read_epoch()
+
+    def invalidate(self):
+        """Forget everything here and in every other process (e.g. after an admin edit)"""
+        self.clear()
+        self.bump()
+        self.epoch = None
+
+    def stats(self):
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+    def _read_epoch(self):
+        try:
+            return os.stat(self.epoch_path).st_mtime_ns
+        except OSError:
+            return None
+
+
+truck_cache = IdentityCache('truck', getattr(settings, 'IDENTITY_CACHE_SIZE', 4096))
+equipment_cache = IdentityCache('equipment', getattr(settings, 'IDENTITY_CACHE_SIZE', 4096))
@@ -0,0 +1,271 @@
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+import zlib
+from contextlib import nullcontext
+
+from django.db import DatabaseError, connection, connections, transaction
+
+from .manifest import manifest, content_digest
+from .metrics import STAGE_SECONDS, DUPLICATES, ERRORS
+from .watcher import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+SECTIONS = ('truck_detections', 'safety_violations', 'equipment_status')
+
+
+class _Ticket:
+    """Tracks the shards of one claimed file until all of them have committed"""
+
+    def __init__(self, path, shards, written_at, digest=None):
+        self.path = path
+        self.remaining = shards
+        self.written_at = written_at
+        self.digest = digest
+        self.failed = False
+
+
+class IngestPool:
+    """
+    Ingest detection files on a pool of worker threads. Files are claimed by
+    renaming them into inflight/ and their records sharded by truck, each shard
+    committed with its own manifest key so a crash only re-ingests the rest.
+    """
+
+    def __init__(self, processor, workers=4, max_batch=200):
+        self.processor = processor
+        self.workers = max(1, workers)
+        self.max_batch = max_batch
+        self.inflight_dir = os.path.join(processor.json_dir, 'inflight', f'{socket.gethostname()}-{os.getpid()}')
+        self.queues = [queue.Queue() for _ in range(self.workers)]
+        self.threads = []
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock() if connection.vendor == 'sqlite' else nullcontext()
+
+        # File written (mtime) -> all of its records committed
+        self.latency = LatencyStats()
+
+    def start(self):
+        """Recover files left behind by dead pools (including an earlier run of this one) and start the workers"""
+        os.makedirs(self.inflight_dir, exist_ok=True)
+        self.recover_inflight()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, args=(index,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Started ingest pool with {self.workers} workers")
+
+    def stop(self):
+        """Finish queued work and stop the workers"""
+        for worker_queue in self.queues:
+            worker_queue.put(None)
+        for thread in self.threads:
+            thread.join(timeout=30)
+        self.threads = []
+        try:
+            os.rmdir(self.inflight_dir)
+        except OSError:
+            pass
+
+    def join(self):
+        """Block until everything submitted so far has been written"""
+        for worker_queue in self.queues:
+            worker_queue.join()
+
+    def backlog(self):
+        """Number of shards waiting for a worker"""
+        return sum(worker_queue.qsize() for worker_queue in self.queues)
+
+    def submit(self, file_paths):
+        """Claim, parse and shard detection files (a single path or a list)"""
+        if isinstance(file_paths, (str, os.PathLike)):
+            file_paths = [file_paths]
+        for file_path in file_paths:
+            claimed = self.claim(file_path)
+            if claimed:
+                self._dispatch(claimed)
+
+    def claim(self, file_path):
+        """Atomically move a file into this pool's inflight directory, or None if someone else got it"""
+        claimed = os.path.join(self.inflight_dir, os.path.basename(file_path))
+        try:
+            os.rename(file_path, claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    def recover_inflight(self):
+        """
+        Return files claimed by pools on this host that are no longer running.
+        Called before the workers start, so anything already in this pool's own
+        directory was left there by an earlier process with the same host name
+        and PID: a restarted container typically gets the same ones back.
+        """
+        root = os.path.dirname(self.inflight_dir)
+        hostname = socket.gethostname()
+        for name in os.listdir(root):
+            host, _, pid = name.rpartition('-')
+            path = os.path.join(root, name)
+            if host != hostname or not pid.isdigit():
+                continue
+            own = path == self.inflight_dir
+            if not own and _pid_alive(int(pid)):
+                continue
+            for filename in os.listdir(path):
+                os.rename(os.path.join(path, filename), os.path.join(self.processor.json_dir, filename))
+                logger.warning(f"Recovered unfinished detection file {filename} from {name}")
+            if not own:
+                os.rmdir(path)
+
+    def shard_for(self, key):
+        return zlib.crc32(str(key).encode()) % self.workers
+
+    def _dispatch(self, claimed):
+        written_at = os.stat(claimed).st_mtime
+        if claimed.endswith('.ndjson'):
+            self.queues[self.shard_for(os.path.basename(claimed))].put((_Ticket(claimed, 1, written_at), None))
+            return
+
+        try:
+            with STAGE_SECONDS.time(stage='parse'):
+                with open(claimed, 'rb') as f:
+                    raw = f.read()
+                digest = content_digest(raw)
+                data = json.loads(raw)
+        except Exception as e:
+            logger.error(f"Error processing detection file {claimed}: {str(e)}")
+            ERRORS.inc(stage='parse')
+            self.processor._move_to_error(claimed)
+            return
+
+        if manifest.seen([digest]):
+            logger.info(f"Skipping already ingested file {os.path.basename(claimed)}")
+            DUPLICATES.inc()
+            self.processor._archive(claimed)
+            return
+
+        shards = {}
+        fallback = self.shard_for(os.path.basename(claimed))
+        for section, key in zip(SECTIONS, ('truck_id', 'location', 'equipment_id')):
+            for record in data.get(section) or []:
+                index = self.shard_for(record.get(key)) if record.get(key) else fallback
+                shards.setdefault(index, {}).setdefault(section, []).append(record)
+
+        if not shards:
+            self.processor._archive(claimed)
+            return
+
+        ticket = _Ticket(claimed, len(shards), written_at, digest)
+        for index, document in shards.items():
+            key = content_digest(f"{digest}:{self.workers}:{index}")
+            self.queues[index].put((ticket, (key, document)))
+
+    def _worker(self, index):
+        worker_queue = self.queues[index]
+        try:
+            while True:
+                item = worker_queue.get()
+                if item is None:
+                    worker_queue.task_done()
+                    break
+
+                batch = [item]
+                stopping = False
+                while len(batch) < self.max_batch:
+                    try:
+                        item = worker_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stopping = True
+                        worker_queue.task_done()
+                        break
+                    batch.append(item)
+
+                try:
+                    self._ingest(batch)
+                except Exception as e:
+                    # Keep the worker alive: its shard of every later file depends on it
+                    logger.error(f"Ingest worker {index} failed on a batch of {len(batch)}: {str(e)}")
+                    ERRORS.inc(stage='db_write')
+                finally:
+                    for _ in batch:
+                        worker_queue.task_done()
+                if stopping:
+                    break
+        finally:
+            connections.close_all()
+
+    def _ingest(self, batch):
+        for ticket, document in batch:
+            if document is None:
+                self._ingest_stream(ticket)
+        batch = [item for item in batch if item[1] is not None]
+        if not batch:
+            return
+
+        keys = [key for _, (key, _) in batch]
+        documents = [document for _, (_, document) in batch]
+        written_at = [ticket.written_at for ticket, _ in batch]
+        with self.write_lock:
+            try:
+                self.processor.ingest_documents(documents, keys=keys, written_at=written_at)
+            except Exception as e:
+                logger.error(f"Shard batch of {len(batch)} failed, retrying individually: {str(e)}")
+                ERRORS.inc(stage='db_write')
+                for (ticket, _), key, document, written in zip(batch, keys, documents, written_at):
+                    try:
+                        self.processor._ingest_with_fallback(document, key, written)
+                    except DatabaseError as e:
+                        logger.error(f"Shard of {ticket.path} could not be written: {str(e)}")
+                        ERRORS.inc(stage='db_write')
+                        ticket.failed = True
+
+        for ticket, _ in batch:
+            self._finish(ticket)
+
+    def _ingest_stream(self, ticket):
+        try:
+            self.processor.process_ndjson_file(ticket.path, lock=self.write_lock)
+        except DatabaseError as e:
+            # Committed chunks are checkpointed, so the file resumes where it stopped if dropped back in
+            logger.error(f"Error ingesting streamed file {ticket.path}: {str(e)}")
+            ERRORS.inc(stage='db_write')
+            self.processor._move_to_error(ticket.path)
+            return
+        self.latency.add(time.time() - ticket.written_at)
+
+    def _finish(self, ticket):
+        """Count one shard of a file as done; archive the file after its last shard"""
+        with self.lock:
+            ticket.remaining -= 1
+            done = ticket.remaining == 0
+        if not done:
+            return
+        if ticket.failed:
+            self.processor._move_to_error(ticket.path)
+            return
+        self.latency.add(time.time() - ticket.written_at)
+        try:
+            with self.write_lock, transaction.atomic():
+                manifest.claim([ticket.digest])
+            self.processor._archive(ticket.path)
+        except (OSError, DatabaseError) as e:
+            # Left in inflight/: recovered at the next start, when the committed shards are skipped
+            logger.error(f"Error archiving {ticket.path}: {str(e)}")
+            ERRORS.inc(stage='archive')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from core.benchmarks import isolated_database, make_documents, bench_ingest
+
+class Command(BaseCommand):
+    help = 'Benchmark detection ingest throughput (rows/sec) against a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--files', type=int, default=200, help='Number of detection files')
+        parser.add_argument('--records', type=int, default=25, help='Records per detection file')
+        parser.add_argument('--trucks', type=int, default=200, help='Distinct truck IDs')
+        parser.add_argument(
+            '--modes', default='legacy,file,batch',
+            help='Comma-separated ingest paths to compare: legacy, file, batch, pool, drop, push'
+        )
+        parser.add_argument(
+            '--workers', default='1,2,4',
+            help='Comma-separated worker counts to try for the pool mode'
+        )
+
+        parser.add_argument(
+            '--interval', type=float, default=0.0,
+            help='Seconds between hand-offs in the drop and push modes (0 saturates the ingester)'
+        )
+
+    def handle(self, *args, **options):
+        documents = make_documents(options['files'], options['records'], trucks=options['trucks'])
+
+        runs = []
+        for mode in options['modes'].split(','):
+            if mode.strip() == 'pool':
+                runs.extend(('pool', int(workers)) for workers in options['workers'].split(','))
+            else:
+                runs.append((mode.strip(), 1))
+
+        results = []
+        for mode, workers in runs:
+            # Each run gets a fresh database so earlier runs don't skew later ones
+            with isolated_database() as workdir:
+                result = bench_ingest(documents, mode, workdir, workers=workers, interval=options['interval'])
+            results.append(result)
+            latency = f", latency p50 {result['p50_ms']}ms p95 {result['p95_ms']}ms" if 'p50_ms' in result else ''
+            self.stdout.write(
+                f"{result['mode']:>8}: {result['records']} rows in {result['seconds']}s "
+                f"({result['rows_per_sec']} rows/sec{latency})"
+            )
+
+        baseline = results[0]['rows_per_sec']
+        for result in results[1:]:
+            if baseline:
+                self.stdout.write(
+                    self.style.SUCCESS(f"{result['mode']} is {result['rows_per_sec'] / baseline:.1f}x {results[0]['mode']}")
+                )
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from core.benchmarks import isolated_database, populate
+from core.query_budgets import check_budgets
+import json
+
+class Command(BaseCommand):
+    help = 'Fail if any endpoint in core/urls.py issues more SQL queries than its declared budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--events', type=int, default=2000,
+            help='Truck events of simulated history to seed the throwaway database with'
+        )
+        parser.add_argument('--only', default=None, help='Comma-separated URL names to check')
+        parser.add_argument('--sql', action='store_true', help='Print the queries of endpoints over budget')
+        parser.add_argument('--json', action='store_true', help='Print the measurements as JSON')
+
+    def handle(self, *args, **options):
+        names = options['only'].split(',') if options['only'] else None
+        # A private cache: measure() clears it to time the uncached path, which mustn't empty a shared one
+        private_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'query_budgets'}}
+        with override_settings(DEBUG=False, CACHES=private_cache), isolated_database():
+            populate(options['events'])
+            results, failures = check_budgets(names)
+
+        if options['json']:
+            self.stdout.write(json.dumps([
+                {key: value for key, value in result.items() if key != 'sql'} for result in results
+            ], indent=2))
+        else:
+            for result in results:
+                over = result['queries'] > result['budget']
+                line = (
+                    f"{result['url']:<40} {result['queries']:>4} / {result['budget']:<4} queries "
+                    f"{result['sql_ms']:>8}ms SQL {result['request_ms']:>8}ms total"
+                )
+                self.stdout.write(self.style.ERROR(line) if over else line)
+                if over and options['sql']:
+                    for sql in result['sql']:
+                        self.stdout.write(f'    {sql}')
+
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f'{len(failures)} endpoint(s) over budget or unchecked')
+        self.stdout.write(self.style.SUCCESS(f'All {len(results)} endpoint requests within budget'))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from core.archive import DetectionArchive
+from datetime import date
+import json
+import sys
+
+class Command(BaseCommand):
+    help = 'Roll processed detection files into daily compressed segments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=float, default=getattr(settings, 'DETECTION_ARCHIVE_MIN_AGE', 300),
+            help='Only compact files processed at least this many seconds ago'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Compact at most this many files'
+        )
+        parser.add_argument(
+            '--retention-days', type=int, default=getattr(settings, 'DETECTION_ARCHIVE_RETENTION_DAYS', None),
+            help='Also delete segments older than this many days'
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help='Print archive size and the number of files waiting to be compacted as JSON and exit'
+        )
+        parser.add_argument(
+            '--fetch', metavar='NAME',
+            help='Write the original contents of an archived file (e.g. processed_detections_1.json) to stdout and exit'
+        )
+        parser.add_argument(
+            '--day', type=date.fromisoformat, default=None,
+            help='Day (YYYY-MM-DD) the file given to --fetch was written (its mtime), which names its segment'
+        )
+
+    def handle(self, *args, **options):
+        archive = DetectionArchive()
+
+        if options['stats']:
+            self.stdout.write(json.dumps(archive.stats()))
+            return
+
+        if options['fetch']:
+            if options['day'] is None:
+                raise CommandError('--fetch needs the --day the file was written')
+            try:
+                data = archive.fetch(options['fetch'], options['day'])
+            except FileNotFoundError:
+                raise CommandError(f"{options['fetch']} is not in the archive for {options['day']}")
+            sys.stdout.buffer.write(data)
+            return
+
+        compacted = archive.compact(min_age=options['min_age'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'Compacted {compacted} processed detection files'))
+
+        if options['retention_days'] is not None:
+            removed = archive.expire(options['retention_days'])
+            self.stdout.write(f'Removed {removed} expired daily segments')
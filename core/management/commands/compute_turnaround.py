@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from core import turnaround
+import json
+
+class Command(BaseCommand):
+    help = 'Pair truck events into visits and add the newly closed ones to the per-shift performance metrics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every shift from the first event')
+        parser.add_argument('--json', action='store_true', help='Print the run summary as JSON')
+
+    def handle(self, *args, **options):
+        summary = turnaround.run(full=options['full'])
+        if options['json']:
+            self.stdout.write(json.dumps(summary))
+        elif summary.get('skipped'):
+            self.stdout.write('Another turnaround run finished first; nothing to do')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Counted {summary['visits']} visits into {summary['shifts']} shifts from {summary['events']} events "
+                f"in {summary['seconds']}s ({summary['open_visits']} still open)"
+            ))
@@ -8,6 +8,12 @@ import random
 class Command(BaseCommand):
     help = 'Generate sample detection data for testing'
     
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', choices=['json', 'ndjson'], default='json',
+            help='Write regular JSON documents or newline-delimited records'
+        )
+    
     def handle(self, *args, **options):
         detection_dir = settings.JSON_DETECTIONS_DIR
         os.makedirs(detection_dir, exist_ok=True)
@@ -38,11 +44,18 @@ class Command(BaseCommand):
                 ] if i % 2 == 0 else []
             }
             
-            filename = f"detection_{datetime.now().strftime('%H%M%S')}_{i}.json"
+            extension = options['format']
+            filename = f"detection_{datetime.now().strftime('%H%M%S')}_{i}.{extension}"
             file_path = os.path.join(detection_dir, filename)
             
             with open(file_path, 'w') as f:
-                json.dump(detection_data, f, indent=2)
+                if extension == 'ndjson':
+                    for record in detection_data['truck_detections']:
+                        f.write(json.dumps({'type': 'truck_detection', **record}) + '\n')
+                    for record in detection_data['safety_violations']:
+                        f.write(json.dumps({'type': 'safety_violation', **record}) + '\n')
+                else:
+                    json.dump(detection_data, f, indent=2)
             
             self.stdout.write(f"Created detection file: {filename}")
         
@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from core.workload import YardProfile, generate, default_window
+from datetime import date
+import os
+import time
+
+class Command(BaseCommand):
+    help = 'Simulate a busy yard (truck visits, equipment and safety streams) for performance testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=float, default=1.0, help='Length of simulated time')
+        parser.add_argument(
+            '--start', type=date.fromisoformat, default=None,
+            help='First simulated day (YYYY-MM-DD); defaults to --days before now'
+        )
+        parser.add_argument('--trucks', type=int, default=500, help='Fleet size (distinct truck IDs)')
+        parser.add_argument('--equipment', type=int, default=40, help='Pieces of equipment')
+        parser.add_argument('--docks', type=int, default=12, help='Loading bays')
+        parser.add_argument('--arrivals-per-hour', type=float, default=30.0, help='Mean truck arrival rate')
+        parser.add_argument(
+            '--diurnal', type=float, default=0.6,
+            help='Day/night swing of the arrival rate (0 = flat, 1 = no night traffic)'
+        )
+        parser.add_argument('--safety-per-hour', type=float, default=0.5, help='Mean safety violation rate')
+        parser.add_argument(
+            '--equipment-changes-per-hour', type=float, default=1.0,
+            help='Status changes per piece of equipment per hour'
+        )
+        parser.add_argument(
+            '--target', choices=['files', 'db'], default='files',
+            help='Write detection files, or bulk insert straight into the database'
+        )
+        parser.add_argument(
+            '--output', default=None,
+            help='Directory for --target files (defaults to the detection directory)'
+        )
+        parser.add_argument(
+            '--window-seconds', type=int, default=60,
+            help='Simulated seconds of detections per file for --target files'
+        )
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1,
+            help='Worker processes; the simulated period is split between them'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def handle(self, *args, **options):
+        if options['days'] <= 0:
+            raise CommandError('--days must be positive')
+
+        profile = YardProfile(
+            trucks=options['trucks'],
+            equipment=options['equipment'],
+            docks=options['docks'],
+            arrivals_per_hour=options['arrivals_per_hour'],
+            diurnal=min(max(options['diurnal'], 0.0), 1.0),
+            safety_per_hour=options['safety_per_hour'],
+            equipment_changes_per_hour=options['equipment_changes_per_hour'],
+        )
+        start, end = default_window(options['days'], options['start'])
+        directory = str(options['output'] or settings.JSON_DETECTIONS_DIR)
+
+        self.stdout.write(
+            f"Simulating {start:%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M} "
+            f"({options['arrivals_per_hour']:g} arrivals/hour) on {options['processes']} processes -> "
+            f"{'database' if options['target'] == 'db' else directory}"
+        )
+        started = time.perf_counter()
+        totals = generate(
+            profile, start, end,
+            target=options['target'],
+            directory=directory,
+            processes=options['processes'],
+            window_seconds=options['window_seconds'],
+            seed=options['seed'],
+        )
+        elapsed = time.perf_counter() - started
+
+        records = sum(count for stream, count in totals.items() if stream not in ('files', 'alerts'))
+        summary = ', '.join(f'{count} {stream}' for stream, count in totals.items())
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {summary} in {elapsed:.1f}s ({records / elapsed if elapsed else 0:.0f} records/sec)"
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from core.rollups import rebuild
+from datetime import date
+
+class Command(BaseCommand):
+    help = 'Recompute the hourly event rollups from the truck and safety events (backfills, bulk edits that bypass signals)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, default=None, help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, default=None, help='Last day to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        rows = rebuild(options['start'], options['end'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} event rollup rows'))
@@ -0,0 +1,109 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from core.benchmarks import isolated_database
+from core.detection_handler import DetectionProcessor
+from core.replay import collect_files, replay
+import json
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+
+class Command(BaseCommand):
+    help = 'Replay archived detection files through the ingest pipeline at a chosen speed, for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source', default=None,
+            help='Directory of detection files (and/or archive segments) to replay; defaults to the processed archive'
+        )
+        parser.add_argument(
+            '--speed', default='1',
+            help="Replay speed relative to the original arrival times, e.g. 1, 10, or 'max' for no pacing"
+        )
+        parser.add_argument(
+            '--yards', type=int, default=1,
+            help='Replay every file once per simulated yard, with yard-suffixed truck/equipment IDs'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'DETECTION_INGEST_WORKERS', 4),
+            help='Number of ingest worker threads'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help='Replay only the first N files'
+        )
+        parser.add_argument(
+            '--live', action='store_true',
+            help='Write into the configured database instead of a throwaway copy; '
+                 'IDs are tagged per run so already ingested files are replayed too'
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=300.0,
+            help='Seconds to wait after the last drop for the files to be ingested'
+        )
+        parser.add_argument(
+            '--json', action='store_true',
+            help='Print the summary as JSON'
+        )
+
+    def handle(self, *args, **options):
+        if options['speed'] == 'max':
+            speed = 0.0
+        else:
+            try:
+                speed = float(options['speed'].rstrip('x'))
+            except ValueError:
+                raise CommandError(f"Invalid --speed {options['speed']!r}; use a number or 'max'")
+            if speed <= 0:
+                raise CommandError('--speed must be positive')
+        if options['yards'] < 1:
+            raise CommandError('--yards must be at least 1')
+
+        source = options['source']
+        if source and not os.path.isdir(source):
+            raise CommandError(f'{source} is not a directory')
+        files = collect_files(source)[:options['limit']]
+        if not files:
+            raise CommandError('Nothing to replay')
+
+        span = files[-1].arrived_at - files[0].arrived_at
+        self.stdout.write(
+            f"Replaying {len(files)} files x {options['yards']} yards spanning {span:.0f}s "
+            f"at {'max' if not speed else f'{speed:g}x'} speed"
+        )
+
+        with (nullcontext() if options['live'] else isolated_database()):
+            # The replay gets its own watched directory so it never picks up real camera files
+            with tempfile.TemporaryDirectory(prefix='replay_') as json_dir:
+                processor = DetectionProcessor(json_dir=json_dir)
+                summary = replay(
+                    files, processor, speed=speed, yards=options['yards'], workers=options['workers'],
+                    run=time.strftime('%Y%m%d%H%M%S') if options['live'] else None, timeout=options['timeout'],
+                )
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        if summary['unfinished']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(summary['unfinished'])} files not ingested after {options['timeout']:g}s: "
+                + ', '.join(summary['unfinished'])
+            ))
+
+        latency = summary['latency_ms']
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['files']} files / {summary['records']} records in {summary['seconds']}s: "
+            f"{summary['files_per_sec']} files/sec, {summary['records_per_sec']} records/sec"
+        ))
+        self.stdout.write(
+            f"pickup to commit: p50 {latency.get('p50_ms', 0)}ms p95 {latency.get('p95_ms', 0)}ms "
+            f"p99 {latency.get('p99_ms', 0)}ms max {latency.get('max_ms', 0)}ms"
+        )
+        self.stdout.write(f"fell behind schedule by up to {summary['max_schedule_slip_s']}s")
+        if summary['duplicates_skipped']:
+            self.stdout.write(f"{summary['duplicates_skipped']} duplicate files/records skipped by the manifest")
+        growth = ', '.join(f'{name} +{count}' for name, count in summary['rows_added'].items())
+        size = summary['db_bytes_added']
+        self.stdout.write(f"DB growth: {growth}" + (f", {size / 1024 / 1024:.1f} MB on disk" if size is not None else ''))
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from core.benchmarks import SCALES, run_suite, compare
+from datetime import datetime
+import json
+import os
+import resource
+
+class Command(BaseCommand):
+    help = 'Run the ingest, dashboard and API benchmark suite and optionally compare it with a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', default='10k',
+            help=f"Comma-separated database sizes to benchmark at: {', '.join(SCALES)}"
+        )
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per view')
+        parser.add_argument(
+            '--processes', type=int, default=os.cpu_count() or 1,
+            help='Processes used to populate each database'
+        )
+        parser.add_argument('--workers', type=int, default=4, help='Ingest pool workers')
+        parser.add_argument(
+            '--output', default=None,
+            help='Where to write the results JSON (default: benchmark_results/<timestamp>.json)'
+        )
+        parser.add_argument('--baseline', default=None, help='Results JSON of an earlier run to compare against')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed relative slowdown before a result counts as a regression'
+        )
+
+    def handle(self, *args, **options):
+        scales = [scale.strip().lower() for scale in options['scales'].split(',') if scale.strip()]
+        unknown = [scale for scale in scales if scale not in SCALES]
+        if unknown:
+            raise CommandError(f"Unknown scale(s) {', '.join(unknown)}; choose from {', '.join(SCALES)}")
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        results = run_suite(
+            scales,
+            requests=options['requests'],
+            processes=options['processes'],
+            workers=options['workers'],
+            log=self.stdout.write,
+        )
+        results['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+        output = options['output'] or os.path.join(
+            settings.BASE_DIR, 'benchmark_results', f"{datetime.now():%Y%m%d-%H%M%S}.json"
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+        for scale, result in results['scales'].items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{scale} ({result['events']} events)"))
+            for mode, ingest in result['ingest'].items():
+                self.stdout.write(f"  ingest {ingest['mode']:>8}: {ingest['rows_per_sec']} rows/sec")
+            for name, view in result['views'].items():
+                self.stdout.write(
+                    f"  {name:<22} p50 {view['p50_ms']}ms p95 {view['p95_ms']}ms p99 {view['p99_ms']}ms "
+                    f"{view['requests_per_sec']} req/s, {view['queries']} queries, peak {view['peak_kb']} KiB, "
+                    f"cache hit p50 {view['hit_p50_ms']}ms"
+                )
+        self.stdout.write(f"Peak RSS {results['max_rss_mb']} MB. Results written to {output}")
+
+        if baseline:
+            regressions = compare(results, baseline, options['tolerance'])
+            if regressions:
+                for line in regressions:
+                    self.stdout.write(self.style.ERROR(f'  {line}'))
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}"))
@@ -0,0 +1,109 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from core.archive import DetectionArchive
+from core.detection_handler import DetectionProcessor
+from core.metrics import write_snapshot
+from core import turnaround
+import signal
+import threading
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Run the detection ingest service: watch the detections directory and write new files to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'DETECTION_INGEST_WORKERS', 4),
+            help='Number of ingest worker threads'
+        )
+        parser.add_argument(
+            '--status-interval', type=float, default=30.0,
+            help='Seconds between backlog/lag reports'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Ingest whatever is waiting now and exit'
+        )
+        parser.add_argument(
+            '--status', action='store_true',
+            help='Print the current backlog and lag as JSON and exit'
+        )
+
+    def handle(self, *args, **options):
+        processor = DetectionProcessor()
+
+        if options['status']:
+            self.stdout.write(json.dumps(processor.backlog()))
+            return
+
+        if options['once']:
+            backlog = processor.backlog()
+            self.stdout.write(f"Ingesting {backlog['pending_files']} waiting detection files...")
+            processor.process_new_detections()
+            write_snapshot('ingest')
+            self.stdout.write(self.style.SUCCESS('Backlog drained'))
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        processor.start_monitoring(workers=options['workers'])
+        compact_interval = getattr(settings, 'DETECTION_ARCHIVE_COMPACT_INTERVAL', 900)
+        if compact_interval:
+            threading.Thread(target=self._compact_loop, args=(stop, compact_interval), daemon=True).start()
+        turnaround_interval = getattr(settings, 'TURNAROUND_INTERVAL', 300)
+        if turnaround_interval:
+            threading.Thread(target=self._turnaround_loop, args=(stop, turnaround_interval), daemon=True).start()
+        self.stdout.write(self.style.SUCCESS(
+            f"Watching {processor.json_dir} with {options['workers']} workers "
+            f"({processor.watcher.active_mode} mode)"
+        ))
+
+        # Metrics are published more often than the status line is printed
+        snapshot_interval = min(options['status_interval'], getattr(settings, 'METRICS_SNAPSHOT_INTERVAL', 5.0))
+        next_report = time.monotonic() + options['status_interval']
+        try:
+            while not stop.wait(snapshot_interval):
+                write_snapshot('ingest')
+                if time.monotonic() >= next_report:
+                    self._report(processor)
+                    next_report += options['status_interval']
+        finally:
+            processor.stop_monitoring()
+            write_snapshot('ingest')
+            self._report(processor)
+            self.stdout.write('Detection ingest stopped')
+
+    def _compact_loop(self, stop, interval):
+        """Periodically roll processed files into the compressed archive"""
+        archive = DetectionArchive()
+        retention_days = getattr(settings, 'DETECTION_ARCHIVE_RETENTION_DAYS', None)
+        while not stop.wait(interval):
+            try:
+                archive.compact(min_age=getattr(settings, 'DETECTION_ARCHIVE_MIN_AGE', 300))
+                if retention_days is not None:
+                    archive.expire(retention_days)
+            except Exception as e:
+                logger.error(f"Error compacting detection archive: {str(e)}")
+
+    def _turnaround_loop(self, stop, interval):
+        """Periodically add newly closed truck visits to the performance metrics"""
+        while not stop.wait(interval):
+            try:
+                turnaround.run()
+            except Exception as e:
+                logger.error(f"Error computing turnaround metrics: {str(e)}")
+
+    def _report(self, processor):
+        backlog = processor.backlog()
+        latency = processor.watcher_stats()
+        self.stdout.write(
+            f"backlog: {backlog['pending_files']} files, {backlog['queued_shards']} queued shards, "
+            f"lag {backlog['lag_seconds']}s | pickup p50 {latency.get('p50_ms', 0)}ms "
+            f"p95 {latency.get('p95_ms', 0)}ms over {latency.get('files', 0)} files"
+        )
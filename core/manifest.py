@@ -0,0 +1,107 @@
+import hashlib
+import math
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import ProcessedDetection
+
+
+def content_digest(data):
+    """Compact content hash used as a manifest key"""
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over hex digests (no false negatives, tunable false positives)"""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.lock = threading.Lock()
+
+    def _positions(self, digest):
+        # Double hashing over two independent halves of the digest
+        h1 = int(digest[:16], 16)
+        h2 = int(digest[16:32], 16) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, digest):
+        with self.lock:
+            for position in self._positions(digest):
+                self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class DetectionManifest:
+    """
+    Every ingested file, shard and record ID, so replays are dropped: the
+    ProcessedDetection table, written with the rows it covers, behind an
+    in-memory Bloom filter that spares the lookup for unseen keys.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bloom = None
+        self.lock = threading.Lock()
+
+    def _filter(self):
+        if self.bloom is None:
+            with self.lock:
+                if self.bloom is None:
+                    bloom = BloomFilter(self.capacity, self.error_rate)
+                    digests = ProcessedDetection.objects.values_list('digest', flat=True)
+                    for digest in digests.iterator(chunk_size=20000):
+                        bloom.add(digest)
+                    self.bloom = bloom
+        return self.bloom
+
+    def seen(self, keys):
+        """The subset of `keys` already in the manifest"""
+        bloom = self._filter()
+        maybe = [key for key in keys if key in bloom]
+        if not maybe:
+            return set()
+        return set(ProcessedDetection.objects.filter(digest__in=maybe).values_list('digest', flat=True))
+
+    def claim(self, keys):
+        """
+        Record `keys` as part of the current transaction and return the ones
+        that were not recorded before; anything else is a duplicate to skip.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return set()
+
+        taken = self.seen(keys)
+        fresh = [key for key in keys if key not in taken]
+        try:
+            with transaction.atomic():
+                ProcessedDetection.objects.bulk_create([ProcessedDetection(digest=key) for key in fresh])
+        except IntegrityError:
+            # Recorded by another process since this filter was loaded
+            taken = set(ProcessedDetection.objects.filter(digest__in=fresh).values_list('digest', flat=True))
+            fresh = [key for key in fresh if key not in taken]
+            ProcessedDetection.objects.bulk_create([ProcessedDetection(digest=key) for key in fresh])
+
+        bloom = self._filter()
+        for key in fresh:
+            bloom.add(key)
+        return set(fresh)
+
+    def reset(self):
+        """Forget the in-memory filter (it is reloaded from the index on next use)"""
+        self.bloom = None
+
+
+manifest = DetectionManifest(
+    capacity=getattr(settings, 'DETECTION_MANIFEST_CAPACITY', 5_000_000),
+    error_rate=getattr(settings, 'DETECTION_MANIFEST_ERROR_RATE', 0.001),
+)
@@ -0,0 +1,279 @@
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self):
+        with self.lock:
+            return [[dict(zip(self.labelnames, key)), value] for key, value in self.values.items()]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state['buckets'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def samples(self):
+        with self.lock:
+            return [
+                [dict(zip(self.labelnames, key)), {**state, 'buckets': list(state['buckets']), 'le': list(self.buckets)}]
+                for key, state in self.values.items()
+            ]
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        """Plain-data copy of every metric, suitable for JSON"""
+        return {
+            metric.name: {'type': metric.kind, 'help': metric.documentation, 'samples': metric.samples()}
+            for metric in self.metrics
+        }
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), chr(92) + "n")}"'
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def render(snapshots):
+    """
+    Prometheus text exposition of one or more registry snapshots. `snapshots`
+    maps a process name to its snapshot; every sample is labelled with it so
+    the web and ingest processes can be told apart.
+    """
+    families = {}
+    for process, snapshot in snapshots.items():
+        for name, family in snapshot.items():
+            entry = families.setdefault(name, {'type': family['type'], 'help': family['help'], 'samples': []})
+            for labels, value in family['samples']:
+                entry['samples'].append(({'process': process, **labels}, value))
+
+    lines = []
+    for name, family in sorted(families.items()):
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for labels, value in family['samples']:
+            if family['type'] != 'histogram':
+                lines.append(f"{name}{_labels(labels)} {value}")
+                continue
+            cumulative = 0
+            for bound, count in zip(value['le'], value['buckets']):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {value['count']}")
+            lines.append(f"{name}_sum{_labels(labels)} {value['sum']}")
+            lines.append(f"{name}_count{_labels(labels)} {value['count']}")
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot_dir():
+    return str(getattr(settings, 'METRICS_SNAPSHOT_DIR', os.path.join(str(settings.DETECTION_DATA_DIR), 'metrics')))
+
+
+_published = set()
+
+
+def _remove_snapshots():
+    # Only this process's: a forked child inherits the parent's set
+    own = f'-{os.getpid()}.json'
+    for path in _published:
+        if not path.endswith(own):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def write_snapshot(role):
+    """
+    Publish this process's metrics for the /api/metrics/ endpoint of the web
+    processes. The file is removed when the process exits.
+    """
+    directory = snapshot_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{role}-{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(path + '.tmp', path)
+    if path not in _published:
+        if not _published:
+            atexit.register(_remove_snapshots)
+        _published.add(path)
+
+
+_publisher = None
+_publisher_lock = threading.Lock()
+
+
+def start_publishing(role):
+    """
+    Publish this process's metrics every METRICS_SNAPSHOT_INTERVAL seconds
+    from a background thread, so that whichever process answers /api/metrics/
+    includes them. Each web worker has its own registry; started by the
+    workers once they have metrics of their own (pushes, scrapes).
+    """
+    global _publisher
+    with _publisher_lock:
+        if _publisher is not None and _publisher.is_alive():
+            return
+        interval = getattr(settings, 'METRICS_SNAPSHOT_INTERVAL', 5.0)
+
+        def publish():
+            while True:
+                try:
+                    write_snapshot(role)
+                except OSError as e:
+                    logger.warning(f"Could not publish metrics snapshot: {str(e)}")
+                time.sleep(interval)
+
+        _publisher = threading.Thread(target=publish, daemon=True)
+        _publisher.start()
+
+
+def read_snapshots(max_age=60):
+    """
+    Recent metric snapshots published by other processes, by process name.
+    Snapshots older than `max_age` are from processes that are gone (killed
+    before they could remove their own) and are deleted.
+    """
+    directory = snapshot_dir()
+    snapshots = {}
+    if not os.path.isdir(directory):
+        return snapshots
+    now = time.time()
+    own = f'-{os.getpid()}.json'
+    for filename in os.listdir(directory):
+        if not filename.endswith('.json') or filename.endswith(own):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+                continue
+            with open(path) as f:
+                snapshots[filename[:-len('.json')]] = json.load(f)
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+class AggregateLog:
+    """Summarise high-volume events in one log line per interval instead of one per event"""
+
+    def __init__(self, log, message, interval=30.0):
+        self.log = log
+        self.message = message
+        self.interval = interval
+        self.counts = {}
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                self.counts[name] = self.counts.get(name, 0) + value
+            elapsed = time.monotonic() - self.started
+            if elapsed < self.interval:
+                return
+            counts, self.counts, self.started = self.counts, {}, time.monotonic()
+        summary = ', '.join(f'{value} {name}' for name, value in counts.items())
+        self.log.info(f"{self.message} in the last {elapsed:.0f}s: {summary}")
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'detection_ingest_stage_seconds', 'Time spent per ingest stage', ['stage']))
+FILES = registry.register(Counter(
+    'detection_files_total', 'Detection files handled, by outcome', ['result']))
+RECORDS = registry.register(Counter(
+    'detection_records_total', 'Detection records written, by type', ['type']))
+DUPLICATES = registry.register(Counter(
+    'detection_duplicates_total', 'Detection files, shards or records skipped as already ingested'))
+ERRORS = registry.register(Counter(
+    'detection_errors_total', 'Errors during ingestion, by stage', ['stage']))
+PENDING_FILES = registry.register(Gauge(
+    'detection_pending_files', 'Detection files waiting in the drop directory'))
+OLDEST_PENDING = registry.register(Gauge(
+    'detection_oldest_pending_seconds', 'Age of the oldest waiting detection file'))
+COMMIT_LAG = registry.register(Histogram(
+    'detection_commit_lag_seconds', 'Detection timestamp to database commit', buckets=LAG_BUCKETS))
+
+ingest_log = AggregateLog(logger, 'Ingested', interval=getattr(settings, 'INGEST_LOG_INTERVAL', 30.0))
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_ingestcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedDetection',
+            fields=[
+                ('digest', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('processed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
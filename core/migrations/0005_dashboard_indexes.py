@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_event_timestamps_default_now'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('acknowledged', False)), fields=['-timestamp'], name='alert_open_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(condition=models.Q(('acknowledged', False)), fields=['priority', 'timestamp'], name='alert_open_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='safetyevent',
+            index=models.Index(fields=['timestamp', 'resolved', 'severity'], name='safetyevent_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truck',
+            index=models.Index(fields=['current_status'], name='truck_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truckevent',
+            index=models.Index(fields=['-timestamp'], name='truckevent_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truckevent',
+            index=models.Index(fields=['event_type', 'timestamp'], name='truckevent_type_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truckevent',
+            index=models.Index(fields=['truck', 'timestamp'], name='truckevent_truck_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:33
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def count_existing_events(apps, schema_editor):
+    SafetyEvent = apps.get_model('core', 'SafetyEvent')
+    SafetyDailyCounter = apps.get_model('core', 'SafetyDailyCounter')
+    rows = (
+        SafetyEvent.objects.order_by()
+        .annotate(date=TruncDate('timestamp'))
+        .values('date', 'violation_type', 'severity', 'resolved')
+        .annotate(count=Count('pk'))
+    )
+    SafetyDailyCounter.objects.bulk_create([SafetyDailyCounter(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_dashboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SafetyDailyCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('violation_type', models.CharField(choices=[('no_ppe', 'No PPE'), ('overspeed', 'Overspeed'), ('zone_breach', 'Restricted Zone Breach'), ('unsafe_operation', 'Unsafe Operation')], max_length=20)),
+                ('severity', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('critical', 'Critical')], max_length=10)),
+                ('resolved', models.BooleanField(default=False)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('date', 'violation_type', 'severity', 'resolved')},
+            },
+        ),
+        migrations.RunPython(count_existing_events, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_safetydailycounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TurnaroundCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scan_from', models.DateTimeField(blank=True, null=True)),
+                ('counted_until', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='performancemetrics',
+            name='dock_minutes_total',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='performancemetrics',
+            name='on_time_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancemetrics',
+            name='turnaround_minutes_total',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='performancemetrics',
+            name='visit_count',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:42
+
+from datetime import timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+from core.shifts import shift_for
+
+
+def roll_up_existing_events(apps, schema_editor):
+    EventRollup = apps.get_model('core', 'EventRollup')
+    sources = [
+        ('truck', apps.get_model('core', 'TruckEvent'), 'event_type'),
+        ('safety', apps.get_model('core', 'SafetyEvent'), 'violation_type'),
+    ]
+    shift_of_hour = {}
+    rows = []
+    for source, model, category in sources:
+        grouped = (
+            model.objects.order_by()
+            .annotate(hour=TruncHour('timestamp', tzinfo=dt_timezone.utc))
+            .values_list('hour', category, 'location')
+            .annotate(count=Count('pk'))
+        )
+        for hour, value, location, count in grouped.iterator():
+            if hour not in shift_of_hour:
+                shift = shift_for(hour)
+                shift_of_hour[hour] = (shift.date, shift.name)
+            shift_date, shift = shift_of_hour[hour]
+            rows.append(EventRollup(
+                hour=hour, shift_date=shift_date, shift=shift, source=source,
+                category=value, location=location, count=count,
+            ))
+            if len(rows) >= 1000:
+                EventRollup.objects.bulk_create(rows)
+                rows = []
+    EventRollup.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_turnaround_engine'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('shift_date', models.DateField()),
+                ('shift', models.CharField(max_length=10)),
+                ('source', models.CharField(choices=[('truck', 'Truck Event'), ('safety', 'Safety Event')], max_length=10)),
+                ('category', models.CharField(max_length=20)),
+                ('location', models.CharField(blank=True, max_length=50)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['shift_date', 'shift', 'source'], name='eventrollup_shift_idx')],
+                'unique_together': {('hour', 'source', 'category', 'location')},
+            },
+        ),
+        migrations.RunPython(roll_up_existing_events, migrations.RunPython.noop),
+    ]
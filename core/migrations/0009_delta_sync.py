@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:49
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def date_existing_alerts(apps, schema_editor):
+    # Existing alerts would otherwise all look changed at migration time
+    Alert = apps.get_model('core', 'Alert')
+    Alert.objects.update(updated_at=F('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_event_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(date_existing_alerts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['updated_at'], name='alert_updated_idx'),
+        ),
+    ]
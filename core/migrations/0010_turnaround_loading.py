@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_delta_sync'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='performancemetrics',
+            name='avg_loading_time',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='performancemetrics',
+            name='load_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performancemetrics',
+            name='loading_minutes_total',
+            field=models.FloatField(default=0.0),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 import uuid
 
 class Truck(models.Model):
@@ -17,6 +18,11 @@ class Truck(models.Model):
     company = models.CharField(max_length=100)
     current_status = models.CharField(max_length=20, choices=TRUCK_STATUS, default='gate_in')
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['current_status'], name='truck_status_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.truck_id} - {self.license_plate}"
 
@@ -34,13 +40,21 @@ class TruckEvent(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     truck = models.ForeignKey(Truck, on_delete=models.CASCADE)
     event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     location = models.CharField(max_length=50, blank=True)
     duration_minutes = models.IntegerField(null=True, blank=True)
     notes = models.TextField(blank=True)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Latest events, and everything since the start of a shift
+            models.Index(fields=['-timestamp'], name='truckevent_timestamp_idx'),
+            # Per-type counts over a time range (supervisor dashboard)
+            models.Index(fields=['event_type', 'timestamp'], name='truckevent_type_ts_idx'),
+            # Per-truck timelines
+            models.Index(fields=['truck', 'timestamp'], name='truckevent_truck_ts_idx'),
+        ]
     
     def __str__(self):
         return f"{self.truck.truck_id} - {self.event_type} - {self.timestamp}"
@@ -98,17 +112,36 @@ class SafetyEvent(models.Model):
     event_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     violation_type = models.CharField(max_length=20, choices=VIOLATION_TYPES)
     severity = models.CharField(max_length=10, choices=SEVERITY_LEVELS)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     location = models.CharField(max_length=50)
     description = models.TextField()
     resolved = models.BooleanField(default=False)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Today's events with their resolved/severity filters answered from the index
+            models.Index(fields=['timestamp', 'resolved', 'severity'], name='safetyevent_ts_idx'),
+        ]
     
     def __str__(self):
         return f"{self.violation_type} - {self.severity} - {self.timestamp}"
 
+class SafetyDailyCounter(models.Model):
+    # Safety events per day and category, kept current by ingestion and the
+    # SafetyEvent signals so the safety dashboard never counts the events themselves
+    date = models.DateField()
+    violation_type = models.CharField(max_length=20, choices=SafetyEvent.VIOLATION_TYPES)
+    severity = models.CharField(max_length=10, choices=SafetyEvent.SEVERITY_LEVELS)
+    resolved = models.BooleanField(default=False)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['date', 'violation_type', 'severity', 'resolved']
+    
+    def __str__(self):
+        return f"{self.date} - {self.violation_type} - {self.severity} - {self.count}"
+
 class PerformanceMetrics(models.Model):
     date = models.DateField()
     shift = models.CharField(max_length=10, choices=[('morning', 'Morning'), ('evening', 'Evening'), ('night', 'Night')])
@@ -116,8 +149,17 @@ class PerformanceMetrics(models.Model):
     avg_turnaround_time = models.FloatField(default=0.0)
     on_time_percentage = models.FloatField(default=0.0)
     delay_percentage = models.FloatField(default=0.0)
+    avg_loading_time = models.FloatField(default=0.0)
     dock_utilization = models.FloatField(default=0.0)
     safety_violations = models.IntegerField(default=0)
+    # Running totals the turnaround engine (core/turnaround.py) merges new
+    # visits into; the percentages and averages above are derived from them
+    visit_count = models.IntegerField(default=0)
+    turnaround_minutes_total = models.FloatField(default=0.0)
+    on_time_count = models.IntegerField(default=0)
+    load_count = models.IntegerField(default=0)
+    loading_minutes_total = models.FloatField(default=0.0)
+    dock_minutes_total = models.FloatField(default=0.0)
     
     class Meta:
         unique_together = ['date', 'shift']
@@ -146,13 +188,90 @@ class Alert(models.Model):
     priority = models.CharField(max_length=10, choices=PRIORITY_LEVELS)
     title = models.CharField(max_length=200)
     message = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     acknowledged = models.BooleanField(default=False)
     related_truck = models.ForeignKey(Truck, on_delete=models.SET_NULL, null=True, blank=True)
     related_equipment = models.ForeignKey(Equipment, on_delete=models.SET_NULL, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Only open alerts are ever listed or counted, and they are a small
+            # fraction of the table once acknowledged ones pile up
+            models.Index(fields=['-timestamp'], condition=models.Q(acknowledged=False), name='alert_open_ts_idx'),
+            models.Index(
+                fields=['priority', 'timestamp'], condition=models.Q(acknowledged=False), name='alert_open_priority_idx'
+            ),
+            # Alerts raised or changed since a polling client's cursor
+            models.Index(fields=['updated_at'], name='alert_updated_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.alert_type} - {self.title}"
+
+class EventRollup(models.Model):
+    # Truck and safety event counts per hour, event type and location, kept
+    # current by ingestion and the event signals. Each hour also records the
+    # shift it belongs to, so dashboards read per-shift, per-location and
+    # per-type totals from a handful of rows instead of counting events.
+    SOURCES = [
+        ('truck', 'Truck Event'),
+        ('safety', 'Safety Event'),
+    ]
+    
+    hour = models.DateTimeField()
+    shift_date = models.DateField()
+    shift = models.CharField(max_length=10)
+    source = models.CharField(max_length=10, choices=SOURCES)
+    category = models.CharField(max_length=20)  # event_type or violation_type
+    location = models.CharField(max_length=50, blank=True)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['hour', 'source', 'category', 'location']
+        indexes = [
+            models.Index(fields=['shift_date', 'shift', 'source'], name='eventrollup_shift_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.hour} {self.source} {self.category} @ {self.location}: {self.count}"
+
+class TurnaroundCheckpoint(models.Model):
+    # Progress of the turnaround engine: events are rescanned from scan_from (the
+    # gate-in of the oldest visit still open) and visits count once they close
+    # after counted_until
+    scan_from = models.DateTimeField(null=True, blank=True)
+    counted_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Turnaround counted until {self.counted_until}"
+
+class DataVersion(models.Model):
+    # Change counter per model (by label, e.g. "core.truckevent"), bumped in the
+    # same transaction as every write to it; polling APIs derive their ETags
+    # from it so an unchanged yard is answered without reading the data
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+class IngestCheckpoint(models.Model):
+    # Resume position of a streamed (NDJSON) detection file, committed with each chunk
+    file_name = models.CharField(max_length=255, unique=True)
+    offset = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.file_name} @ {self.offset}"
+
+class ProcessedDetection(models.Model):
+    # Manifest of ingested detection files, shards and records by content hash
+    digest = models.CharField(max_length=32, primary_key=True)
+    processed_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.alert_type} - {self.title}"
\ No newline at end of file
+        return self.digest
\ No newline at end of file
@@ -0,0 +1,178 @@
+import json
+import logging
+import math
+import os
+import queue
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.db import connections
+
+from .ingest_pool import SECTIONS
+from .metrics import ERRORS, start_publishing
+from .utils import bearer_token_valid
+from .watcher import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+
+def push_token_valid(request):
+    """Whether the request carries one of the configured DETECTION_PUSH_TOKENS as a bearer token"""
+    return bearer_token_valid(request, getattr(settings, 'DETECTION_PUSH_TOKENS', []))
+
+
+def decode_batch(body, content_encoding=''):
+    """
+    Decode a pushed batch into a list of detection documents. The body is one
+    document in the detection file schema or a list of them, optionally gzip
+    compressed. Raises ValueError for anything else.
+    """
+    max_bytes = getattr(settings, 'DETECTION_PUSH_MAX_BYTES', 16 * 1024 * 1024)
+    if 'gzip' in content_encoding.lower():
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(body, max_bytes + 1)
+        except zlib.error as e:
+            raise ValueError(f'Invalid gzip body: {e}')
+        if len(body) > max_bytes or decompressor.unconsumed_tail:
+            raise ValueError(f'Batch exceeds {max_bytes} bytes uncompressed')
+
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise ValueError(f'Invalid JSON: {e}')
+
+    documents = payload if isinstance(payload, list) else [payload]
+    if not all(isinstance(document, dict) for document in documents):
+        raise ValueError('Expected a detection document or a list of them')
+    return documents
+
+
+class PushIngester:
+    """
+    Bounded queue between the push endpoint and a consumer thread that writes
+    whatever has queued up in one transaction. A full queue answers 429;
+    unwritable documents are set aside in the error directory.
+    """
+
+    def __init__(self, processor, maxsize=100, max_batch=200):
+        self.processor = processor
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.max_batch = max_batch
+        self.latency = LatencyStats()
+        self.seconds_per_item = 0.0
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def offer(self, documents):
+        """Queue a batch of documents; False if the ingester is too far behind to take it"""
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((time.time(), documents))
+        except queue.Full:
+            return False
+        return True
+
+    def retry_after(self):
+        """Seconds a rejected client should wait before retrying"""
+        estimate = self.queue.qsize() * self.seconds_per_item
+        return min(30, max(1, math.ceil(estimate)))
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def join(self):
+        """Block until everything queued so far has been written"""
+        self.queue.join()
+
+    def _ensure_started(self):
+        if self.thread and self.thread.is_alive():
+            return
+        with self.lock:
+            if not (self.thread and self.thread.is_alive()):
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        try:
+            while True:
+                items = [self.queue.get()]
+                while len(items) < self.max_batch:
+                    try:
+                        items.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    self._write(items)
+                except Exception as e:
+                    logger.error(f"Error writing {len(items)} pushed batches: {str(e)}")
+                    ERRORS.inc(stage='db_write')
+                finally:
+                    for _ in items:
+                        self.queue.task_done()
+        finally:
+            connections.close_all()
+
+    def _write(self, items):
+        started = time.perf_counter()
+        documents = [document for _, batch in items for document in batch]
+        received_at = [enqueued_at for enqueued_at, batch in items for _ in batch]
+        try:
+            self.processor.ingest_documents(documents, written_at=received_at)
+        except Exception as e:
+            logger.error(f"Pushed batch of {len(documents)} documents failed, retrying individually: {str(e)}")
+            ERRORS.inc(stage='db_write')
+            # Every document was acknowledged with a 202: whatever can't be written is kept
+            failed, rejected = [], {}
+            for document, received in zip(documents, received_at):
+                try:
+                    self.processor._ingest_with_fallback(document, written_at=received, rejected=rejected)
+                except Exception as e:
+                    logger.error(f"Pushed document could not be written: {str(e)}")
+                    failed.append(document)
+            if rejected:
+                failed.append(rejected)
+            if failed:
+                self._set_aside(failed)
+
+        finished = time.time()
+        per_item = (time.perf_counter() - started) / len(items)
+        self.seconds_per_item = per_item if not self.seconds_per_item else 0.8 * self.seconds_per_item + 0.2 * per_item
+        for enqueued_at, _ in items:
+            self.latency.add(finished - enqueued_at)
+
+    def _set_aside(self, documents):
+        """Save documents that could not be written to the error directory, as one detection file"""
+        merged = {section: [record for document in documents for record in document.get(section) or []] for section in SECTIONS}
+        error_dir = os.path.join(self.processor.json_dir, 'error')
+        path = os.path.join(error_dir, f'error_push_{time.time_ns()}.json')
+        try:
+            os.makedirs(error_dir, exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(merged, f)
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Could not save {len(documents)} unwritten pushed documents: {str(e)}")
+            return
+        logger.error(f"Saved {len(documents)} pushed documents that could not be written to {path}")
+
+
+_push_ingester = None
+_push_ingester_lock = threading.Lock()
+
+
+def get_push_ingester():
+    """The process-wide push ingester, created on first use"""
+    global _push_ingester
+    with _push_ingester_lock:
+        if _push_ingester is None:
+            from .detection_handler import detection_processor
+            _push_ingester = PushIngester(
+                detection_processor,
+                maxsize=getattr(settings, 'DETECTION_PUSH_QUEUE_SIZE', 100),
+                max_batch=getattr(settings, 'DETECTION_BATCH_MAX_FILES', 200),
+            )
+            # Its metrics live in this web worker; publish them for whichever worker is scraped
+            start_publishing('web')
+        return _push_ingester
@@ -0,0 +1,163 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.urls import URLPattern, reverse
+
+# Maximum SQL queries per request for every endpoint in core/urls.py, by URL
+# name, measured as a logged-in superuser against seeded data (see
+# check_query_budgets). Every request includes three for the session read, the
+# user lookup and the session save (SESSION_SAVE_EVERY_REQUEST). The cache is
+# cleared before the measured request, so views served from core/cache.py are
+# held to the queries of computing their data, not of a cache hit.
+# A new endpoint needs an entry here (or in SKIPPED) before the check passes.
+QUERY_BUDGETS = {
+    'dashboard_home': 3,
+    'operations_dashboard': 10,
+    'supervisor_dashboard': 7,
+    'executive_dashboard': 5,
+    'safety_dashboard': 7,
+    'analytics_dashboard': 3,
+    'admin_panel': 3,
+    'login': 2,
+    'api_live_events': 5,
+    'api_alerts': 5,
+    'api_cv_detections': 5,
+    'api_shift_events': 5,
+    'api_metrics': 3,
+    'api_site_map': 6,
+    'api_dashboard_stats': 5,
+    'download_shift_report': 3,
+    'download_analytics_report': 3,
+}
+
+# Views served from core/cache.py, and the budget for a request answered from
+# the cache: the per-request three plus the data version lookup
+CACHE_HIT_BUDGETS = {
+    'operations_dashboard': 4,
+    'supervisor_dashboard': 4,
+    'executive_dashboard': 4,
+    'safety_dashboard': 4,
+    'api_live_events': 4,
+    'api_alerts': 4,
+    'api_cv_detections': 4,
+    'api_shift_events': 4,
+    'api_site_map': 4,
+    'api_dashboard_stats': 4,
+}
+
+# Endpoints answering conditional GETs, and the budget for a poll whose ETag is
+# still current (304 Not Modified): the per-request three plus the version lookup
+REVALIDATE_BUDGETS = {
+    'api_live_events': 4,
+    'api_alerts': 4,
+}
+
+# Endpoints that can't be exercised with a plain GET, and why
+SKIPPED = {
+    'api_push_detections': 'POST only; writes go through the push ingest queue',
+}
+
+# URL arguments to request parameterised endpoints with; each variant is held to the same budget
+URL_VARIANTS = {
+    'download_shift_report': [{'format_type': 'pdf'}, {'format_type': 'csv'}, {'format_type': 'excel'}],
+    'download_analytics_report': [{'format_type': 'pdf'}, {'format_type': 'csv'}, {'format_type': 'excel'}],
+}
+
+
+def core_url_names():
+    from . import urls
+    return [pattern.name for pattern in urls.urlpatterns if isinstance(pattern, URLPattern) and pattern.name]
+
+
+# Transaction control statements some backends issue through execute(); not counted as queries
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+
+class QueryTimer:
+    """Database execute wrapper that records each query and how long it took"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if not sql.lstrip().upper().startswith(TRANSACTION_STATEMENTS):
+                self.queries.append((sql, time.perf_counter() - started))
+
+
+def measure(name, client, kwargs=None, revalidate=False, cache_hit=False):
+    """
+    Query count and total SQL time of one GET request, after a warm-up
+    request. The cache is cleared in between unless measuring a `cache_hit`.
+    With `revalidate`, the request carries the warm-up response's ETag.
+    """
+    url = reverse(name, kwargs=kwargs)
+    warm_up = client.get(url)
+    headers = {'If-None-Match': warm_up['ETag']} if revalidate and warm_up.has_header('ETag') else {}
+    if not cache_hit:
+        cache.clear()
+    timer = QueryTimer()
+    started = time.perf_counter()
+    with connection.execute_wrapper(timer):
+        response = client.get(url, headers=headers)
+    elapsed = time.perf_counter() - started
+    return {
+        'url': f'{url} (revalidate)' if revalidate else f'{url} (cache hit)' if cache_hit else url,
+        'status': response.status_code,
+        'queries': len(timer.queries),
+        'sql_ms': round(sum(seconds for _, seconds in timer.queries) * 1000, 2),
+        'request_ms': round(elapsed * 1000, 2),
+        'sql': [sql for sql, _ in timer.queries],
+    }
+
+
+def check_budgets(names=None):
+    """
+    Measure every endpoint (or just `names`) against the current database and
+    compare with QUERY_BUDGETS. Returns (results, failures): one result per
+    requested URL and a list of human-readable problems.
+    """
+    user, _ = User.objects.get_or_create(username='query_budget', defaults={'is_superuser': True, 'is_staff': True})
+    client = Client()
+    client.force_login(user)
+
+    results = []
+    failures = []
+    for name in names or core_url_names():
+        if name in SKIPPED:
+            continue
+        budget = QUERY_BUDGETS.get(name)
+        if budget is None:
+            failures.append(f'{name}: no query budget declared in core/query_budgets.py')
+            continue
+        for kwargs in URL_VARIANTS.get(name, [None]):
+            result = measure(name, client, kwargs)
+            result.update(name=name, budget=budget)
+            results.append(result)
+            if result['status'] >= 400:
+                failures.append(f"{result['url']}: HTTP {result['status']}")
+            elif result['queries'] > budget:
+                failures.append(f"{result['url']}: {result['queries']} queries, budget {budget}")
+        if name in CACHE_HIT_BUDGETS:
+            result = measure(name, client, cache_hit=True)
+            result.update(name=name, budget=CACHE_HIT_BUDGETS[name])
+            results.append(result)
+            if result['status'] >= 400:
+                failures.append(f"{result['url']}: HTTP {result['status']}")
+            elif result['queries'] > result['budget']:
+                failures.append(f"{result['url']}: {result['queries']} queries, budget {result['budget']}")
+        if name in REVALIDATE_BUDGETS:
+            result = measure(name, client, revalidate=True)
+            result.update(name=name, budget=REVALIDATE_BUDGETS[name])
+            results.append(result)
+            if result['status'] != 304:
+                failures.append(f"{result['url']}: HTTP {result['status']}, expected 304 Not Modified")
+            elif result['queries'] > result['budget']:
+                failures.append(f"{result['url']}: {result['queries']} queries, budget {result['budget']}")
+    return results, failures
@@ -0,0 +1,224 @@
+import json
+import os
+import time
+
+from django.db import connection
+
+from .archive import DetectionArchive
+from .metrics import DUPLICATES
+from .models import Truck, TruckEvent, SafetyEvent, Alert, Equipment
+
+# Record fields that identify a truck, piece of equipment or detection, suffixed per simulated yard
+YARD_KEYS = ('truck_id', 'equipment_id', 'detection_id')
+
+GROWTH_MODELS = (Truck, TruckEvent, SafetyEvent, Alert, Equipment)
+
+
+class ReplayFile:
+    """One detection file to replay: its name, when it originally arrived and how to read it"""
+
+    def __init__(self, name, arrived_at, read):
+        self.name = name
+        self.arrived_at = arrived_at
+        self.read = read
+
+
+def collect_files(source=None):
+    """
+    Detection files to replay, in original arrival (mtime) order. `source` is
+    any directory of .json/.ndjson files; archive segments found in it are read
+    too. By default this is the processed/ directory plus the compacted archive.
+    """
+    if source is None:
+        archive = DetectionArchive()
+        directories = [archive.processed_dir]
+    else:
+        archive = DetectionArchive(processed_dir=source, archive_dir=source)
+        directories = [source]
+
+    files = []
+    for directory in directories:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(('.json', '.ndjson')):
+                    files.append(ReplayFile(entry.name, entry.stat().st_mtime, _file_reader(entry.path)))
+
+    for day in archive.days():
+        for entry in archive.index(day):
+            files.append(ReplayFile(entry['name'], entry['mtime'], _archive_reader(archive, day, entry)))
+
+    files.sort(key=lambda replay_file: replay_file.arrived_at)
+    return files
+
+
+def _file_reader(path):
+    def read():
+        with open(path, 'rb') as f:
+            return f.read()
+    return read
+
+
+def _archive_reader(archive, day, entry):
+    return lambda: archive.read_entry(day, entry)
+
+
+def rekey(raw, name, suffix):
+    """
+    A copy of a detection file with `suffix` appended to its truck, equipment
+    and detection IDs, e.g. `-Y<yard>` so each simulated yard's records are
+    distinct, or a per-run tag so a replay isn't skipped by the manifest.
+    """
+    def rename(document):
+        for value in document.values():
+            if not isinstance(value, list):
+                continue
+            for record in value:
+                if not isinstance(record, dict):
+                    continue
+                for key in YARD_KEYS:
+                    if record.get(key):
+                        record[key] = f'{record[key]}{suffix}'
+        for key in YARD_KEYS:
+            if document.get(key):
+                # A newline-delimited record rather than a document
+                document[key] = f'{document[key]}{suffix}'
+        return document
+
+    if not name.endswith('.ndjson'):
+        try:
+            document = json.loads(raw)
+        except ValueError:
+            # Replayed as is, so it ends up in error/ like the original did
+            return raw
+        return json.dumps(rename(document)).encode() if isinstance(document, dict) else raw
+
+    lines = []
+    for line in raw.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            lines.append(line)
+            continue
+        lines.append(json.dumps(rename(record)).encode() if isinstance(record, dict) else line)
+    return b'\n'.join(lines) + b'\n'
+
+
+def record_count(raw, name):
+    """Number of detection records in a file"""
+    if name.endswith('.ndjson'):
+        return sum(1 for line in raw.splitlines() if line.strip())
+    try:
+        document = json.loads(raw)
+    except ValueError:
+        return 0
+    return sum(len(value) for value in document.values() if isinstance(value, list))
+
+
+def table_counts():
+    return {model.__name__: model.objects.count() for model in GROWTH_MODELS}
+
+
+def database_bytes():
+    """On-disk size of the default database, where the backend can tell us"""
+    if connection.vendor == 'sqlite':
+        name = str(connection.settings_dict['NAME'])
+        return sum(os.path.getsize(path) for path in (name, name + '-wal') if os.path.exists(path))
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_database_size(current_database())')
+            return cursor.fetchone()[0]
+    return None
+
+
+def replay(files, processor, speed=1.0, yards=1, workers=4, run=None, timeout=300.0):
+    """
+    Drop `files` into the processor's watched directory, spaced out like their
+    original arrivals divided by `speed` (0 means as fast as possible), and wait
+    up to `timeout` seconds after the last drop for all of them to be ingested.
+    Every file is dropped once per yard. A `run` tag is added to every ID, so
+    files this database has already ingested are ingested again rather than
+    skipped as duplicates. Returns a summary of throughput, pickup-to-commit
+    latency and DB growth, and the files that never finished.
+    """
+    counts_before = table_counts()
+    bytes_before = database_bytes()
+    duplicates_before = _duplicates()
+
+    processor.start_monitoring(workers=workers)
+    dropped = []
+    records = 0
+    max_slip = 0.0
+    started = time.perf_counter()
+    try:
+        first = files[0].arrived_at if files else 0.0
+        for index, replay_file in enumerate(files):
+            if speed:
+                due = started + (replay_file.arrived_at - first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    max_slip = max(max_slip, -delay)
+
+            raw = replay_file.read()
+            base_name = replay_file.name
+            if base_name.startswith('processed_'):
+                base_name = base_name[len('processed_'):]
+            for yard in range(yards):
+                suffix = (f'-R{run}' if run else '') + (f'-Y{yard + 1}' if yards > 1 else '')
+                data = rekey(raw, base_name, suffix) if suffix else raw
+                name = f'replay_{index:07d}_{yard}_{base_name}'
+                _drop(processor.json_dir, name, data)
+                dropped.append(name)
+                records += record_count(data, base_name)
+
+        unfinished = _wait_for(processor, dropped, timeout)
+        elapsed = time.perf_counter() - started
+    finally:
+        processor.stop_monitoring()
+
+    counts_after = table_counts()
+    bytes_after = database_bytes()
+    latency = processor.pool.latency.snapshot()
+    return {
+        'files': len(dropped),
+        'records': records,
+        'seconds': round(elapsed, 3),
+        'files_per_sec': round(len(dropped) / elapsed, 1) if elapsed else 0.0,
+        'records_per_sec': round(records / elapsed, 1) if elapsed else 0.0,
+        'max_schedule_slip_s': round(max_slip, 3),
+        'duplicates_skipped': _duplicates() - duplicates_before,
+        'latency_ms': latency,
+        'rows_added': {name: counts_after[name] - counts_before[name] for name in counts_after},
+        'db_bytes_added': bytes_after - bytes_before if bytes_before is not None else None,
+        'unfinished': unfinished,
+    }
+
+
+def _duplicates():
+    return sum(value for _, value in DUPLICATES.samples())
+
+
+def _drop(directory, name, data):
+    """Write then rename, the way a camera should drop files"""
+    path = os.path.join(directory, name)
+    with open(os.path.join(directory, f'.{name}.tmp'), 'wb') as f:
+        f.write(data)
+    os.rename(os.path.join(directory, f'.{name}.tmp'), path)
+
+
+def _wait_for(processor, names, timeout, poll=0.05):
+    """
+    Wait up to `timeout` seconds for the files `names` to be archived or moved
+    aside as errors. Returns the names of those that weren't.
+    """
+    error_dir = os.path.join(processor.json_dir, 'error')
+    pending = set(names)
+    deadline = time.monotonic() + timeout
+    while True:
+        pending.difference_update(name[len('processed_'):] for name in os.listdir(processor.processed_dir))
+        if os.path.isdir(error_dir):
+            pending.difference_update(name[len('error_'):] for name in os.listdir(error_dir))
+        if not pending or time.monotonic() >= deadline:
+            return sorted(pending)
+        time.sleep(poll)
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+
+from . import versions
+
+# Dashboard roles, one bit each, and the auth groups that grant them
+OPERATIONS = 1 << 0
+SUPERVISOR = 1 << 1
+EXECUTIVE = 1 << 2
+SAFETY = 1 << 3
+
+ROLE_GROUPS = {
+    'Operations': OPERATIONS,
+    'Supervisor': SUPERVISOR,
+    'Executive': EXECUTIVE,
+    'Safety': SAFETY,
+}
+
+
+def _user_key(pk):
+    return f'core:roles:user:{pk}'
+
+
+def compute_roles(user):
+    """A user's role mask, from one query over their groups"""
+    mask = 0
+    for name in user.groups.filter(name__in=ROLE_GROUPS).values_list('name', flat=True):
+        mask |= ROLE_GROUPS[name]
+    return mask
+
+
+def user_roles(user):
+    """
+    A user's role mask: remembered on the user object for the rest of the
+    request and cached per user under the Group data version, which any
+    group or group membership change bumps. The version is read from the
+    database, so a revoked role is gone in every process on its next request.
+    """
+    if not user.is_authenticated:
+        return 0
+    # getattr, not __dict__: request.user is a lazy wrapper around the user
+    mask = getattr(user, '_role_mask', None)
+    if mask is not None:
+        return mask
+
+    generation = versions.for_request(user, Group)[0][versions.version_name(Group)]
+    key = _user_key(user.pk)
+    entry = cache.get(key)
+    if entry is not None and entry[0] == generation:
+        mask = entry[1]
+    else:
+        mask = compute_roles(user)
+        cache.set(key, (generation, mask), getattr(settings, 'ROLES_CACHE_TIMEOUT', 300))
+    user._role_mask = mask
+    return mask
+
+
+def has_role(user, role):
+    """Whether `user` may see the dashboards of `role`; superusers may see all"""
+    return user.is_superuser or bool(user_roles(user) & role)
+
+
+class Roles:
+    """A role mask for templates: {{ roles.name }}, {% if roles.supervisor %}"""
+
+    def __init__(self, mask):
+        self.mask = mask
+        self.operations = bool(mask & OPERATIONS)
+        self.supervisor = bool(mask & SUPERVISOR)
+        self.executive = bool(mask & EXECUTIVE)
+        self.safety = bool(mask & SAFETY)
+
+    @property
+    def name(self):
+        """Name of the user's first role, for display"""
+        return next((name for name, role in ROLE_GROUPS.items() if self.mask & role), '')
@@ -0,0 +1,129 @@
+from collections import Counter
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import TruckEvent, SafetyEvent, EventRollup
+from .shifts import shift_for
+from . import versions
+
+TRUCK = 'truck'
+SAFETY = 'safety'
+
+# Everything a rollup row is keyed on; shift_date and shift follow from the hour
+KEY_FIELDS = ('hour', 'source', 'category', 'location')
+
+# Per source: the model and the field counted as the rollup's category
+SOURCES = {
+    TRUCK: (TruckEvent, 'event_type'),
+    SAFETY: (SafetyEvent, 'violation_type'),
+}
+
+_shift_of_hour = {}
+
+
+def _hour(timestamp):
+    """Start of the UTC hour `timestamp` falls in"""
+    return timestamp.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _shift_key(hour):
+    """(shift date, shift name) an hour belongs to; shifts start on the hour, so one lookup covers the hour"""
+    key = _shift_of_hour.get(hour)
+    if key is None:
+        shift = shift_for(hour)
+        key = _shift_of_hour[hour] = (shift.date, shift.name)
+    return key
+
+
+def rollup_key(event):
+    """(hour, source, category, location) of the rollup row a truck or safety event is counted in"""
+    if isinstance(event, SafetyEvent):
+        return (_hour(event.timestamp), SAFETY, event.violation_type, event.location)
+    return (_hour(event.timestamp), TRUCK, event.event_type, event.location)
+
+
+def _row(key, count=0):
+    shift_date, shift = _shift_key(key[0])
+    return EventRollup(shift_date=shift_date, shift=shift, count=count, **dict(zip(KEY_FIELDS, key)))
+
+
+def apply(deltas):
+    """
+    Add `deltas` ({rollup key: change}) to the rollups, creating missing rows.
+    Like the safety counters: rows are created with ignore_conflicts and
+    changed with relative UPDATEs, in key order so concurrent ingest workers
+    lock them in the same order.
+    """
+    deltas = {key: change for key, change in deltas.items() if change}
+    if not deltas:
+        return
+    with transaction.atomic():
+        EventRollup.objects.bulk_create([_row(key) for key in deltas], ignore_conflicts=True)
+        for key in sorted(deltas):
+            EventRollup.objects.filter(**dict(zip(KEY_FIELDS, key))).update(count=F('count') + deltas[key])
+
+
+def record(events):
+    """Count newly created truck or safety events (bulk_create sends no signals, so ingestion calls this)"""
+    apply(Counter(rollup_key(event) for event in events))
+
+
+def rebuild(start=None, end=None):
+    """
+    Recompute the rollups from the events with one GROUP BY per source, for
+    days in [start, end] or all of them. For backfills and changes that
+    bypass the signals. Returns the number of rollup rows.
+    """
+    start_at = timezone.make_aware(datetime.combine(start, time())) if start else None
+    end_at = timezone.make_aware(datetime.combine(end + timedelta(days=1), time())) if end else None
+
+    rollups = EventRollup.objects.all()
+    if start_at:
+        rollups = rollups.filter(hour__gte=start_at)
+    if end_at:
+        rollups = rollups.filter(hour__lt=end_at)
+
+    rows = []
+    for source, (model, category) in SOURCES.items():
+        events = model.objects.order_by()
+        if start_at:
+            events = events.filter(timestamp__gte=start_at)
+        if end_at:
+            events = events.filter(timestamp__lt=end_at)
+        grouped = (
+            events.annotate(hour=TruncHour('timestamp', tzinfo=dt_timezone.utc))
+            .values_list('hour', category, 'location')
+            .annotate(count=Count('pk'))
+        )
+        rows.extend(_row((hour, source, value, location), count) for hour, value, location, count in grouped)
+
+    with transaction.atomic():
+        rollups.delete()
+        created = EventRollup.objects.bulk_create(rows, batch_size=1000)
+        versions.bump(EventRollup)
+    return len(created)
+
+
+def shift_summary(shift):
+    """
+    Truck event counts of a shift from its rollups, in one grouped query:
+    per event type (every type present, zero if none) plus 'total', and the
+    dockings per location
+    """
+    counts = dict.fromkeys((event_type for event_type, _ in TruckEvent.EVENT_TYPES), 0)
+    dockings = {}
+    rows = (
+        EventRollup.objects.filter(shift_date=shift.date, shift=shift.name, source=TRUCK)
+        .order_by().values_list('category', 'location').annotate(total=Sum('count'))
+    )
+    for event_type, location, total in rows:
+        counts[event_type] = counts.get(event_type, 0) + total
+        if event_type == 'docked':
+            dockings[location] = total
+    counts['total'] = sum(counts.values())
+    return counts, dockings
+
@@ -0,0 +1,89 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import SafetyEvent, SafetyDailyCounter
+from . import versions
+
+CRITICAL_SEVERITIES = ('high', 'critical')
+
+# Everything a counter row is keyed on besides the date
+KEY_FIELDS = ('violation_type', 'severity', 'resolved')
+
+
+def counter_key(event):
+    """(date, violation_type, severity, resolved) of the counter an event belongs to"""
+    return (timezone.localdate(event.timestamp), event.violation_type, event.severity, event.resolved)
+
+
+def apply(deltas):
+    """
+    Add `deltas` ({counter key: change}) to the counters, creating missing
+    rows. Safe against concurrent writers: rows are created with
+    ignore_conflicts and changed with relative UPDATEs, in key order so
+    concurrent ingest workers lock them in the same order.
+    """
+    deltas = {key: change for key, change in deltas.items() if change}
+    if not deltas:
+        return
+    keys = sorted(deltas)
+    with transaction.atomic():
+        SafetyDailyCounter.objects.bulk_create(
+            [SafetyDailyCounter(date=key[0], **dict(zip(KEY_FIELDS, key[1:]))) for key in keys],
+            ignore_conflicts=True,
+        )
+        for key in keys:
+            SafetyDailyCounter.objects.filter(date=key[0], **dict(zip(KEY_FIELDS, key[1:]))).update(
+                count=F('count') + deltas[key]
+            )
+
+
+def record(events):
+    """Count newly created safety events (bulk_create sends no signals, so ingestion calls this)"""
+    apply(Counter(counter_key(event) for event in events))
+
+
+def rebuild(start=None, end=None):
+    """
+    Recompute the counters from SafetyEvent with one GROUP BY, for days in
+    [start, end] or all of them. Needed after changes that bypass the
+    signals, such as QuerySet.update(). Returns the number of counter rows.
+    """
+    events = SafetyEvent.objects.order_by().annotate(date=TruncDate('timestamp'))
+    counters = SafetyDailyCounter.objects.all()
+    if start:
+        events = events.filter(date__gte=start)
+        counters = counters.filter(date__gte=start)
+    if end:
+        events = events.filter(date__lte=end)
+        counters = counters.filter(date__lte=end)
+
+    rows = events.values('date', *KEY_FIELDS).annotate(count=Count('pk'))
+    with transaction.atomic():
+        counters.delete()
+        created = SafetyDailyCounter.objects.bulk_create(
+            [SafetyDailyCounter(**row) for row in rows], batch_size=1000
+        )
+        versions.bump(SafetyDailyCounter)
+    return len(created)
+
+
+def breakdown(day):
+    """
+    A day's safety totals from its counter rows (one per category with
+    events, however many events there are): total, unresolved and critical
+    counts and the number of events per violation type.
+    """
+    rows = SafetyDailyCounter.objects.filter(date=day, count__gt=0).values_list(*KEY_FIELDS, 'count')
+    summary = {'total': 0, 'unresolved': 0, 'critical': 0, 'violation_types': {}}
+    for violation_type, severity, resolved, count in rows:
+        summary['total'] += count
+        if not resolved:
+            summary['unresolved'] += count
+        if severity in CRITICAL_SEVERITIES:
+            summary['critical'] += count
+        summary['violation_types'][violation_type] = summary['violation_types'].get(violation_type, 0) + count
+    return summary
@@ -0,0 +1,168 @@
+import base64
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse
+
+from .models import Truck, TruckEvent, Alert
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Display labels for the choice fields the polling APIs return, looked up once
+# instead of calling get_FOO_display() on a model instance per row
+EVENT_TYPE_LABELS = dict(TruckEvent.EVENT_TYPES)
+TRUCK_STATUS_LABELS = dict(Truck.TRUCK_STATUS)
+
+LIVE_EVENT_FIELDS = ('id', 'truck__truck_id', 'event_type', 'timestamp', 'location')
+CV_DETECTION_FIELDS = ('id', 'truck__truck_id', 'event_type', 'timestamp', 'location', 'notes')
+ALERT_FIELDS = ('alert_id', 'alert_type', 'priority', 'title', 'message', 'timestamp', 'acknowledged')
+SHIFT_EVENT_FIELDS = ('id', 'timestamp', 'truck__truck_id', 'event_type', 'location', 'truck__current_status')
+
+
+def json_response(data, status=200):
+    """JsonResponse, encoded with orjson when it is installed"""
+    if orjson is None:
+        return JsonResponse(data, status=status)
+    return HttpResponse(orjson.dumps(data), status=status, content_type='application/json')
+
+
+def _sync_start(since):
+    """
+    Where a delta starting at cursor `since` begins reading. Rows are stamped
+    before their transaction commits, so it reaches DELTA_SYNC_OVERLAP
+    seconds further back to catch late commits; clients drop rows whose id
+    they already have.
+    """
+    return since - timedelta(seconds=getattr(settings, 'DELTA_SYNC_OVERLAP', 10.0))
+
+
+def encode_since(timestamp):
+    """Opaque delta-sync cursor for the data as of `timestamp`"""
+    return base64.urlsafe_b64encode(timestamp.isoformat().encode()).decode()
+
+
+def decode_since(cursor):
+    """The timestamp in an encode_since() cursor; raises ValueError for anything else"""
+    try:
+        timestamp = datetime.fromisoformat(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (TypeError, UnicodeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
+    if timestamp.tzinfo is None:
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    return timestamp
+
+
+def live_events(limit=20, since=None):
+    """The latest truck events as api_live_events returns them (only those since cursor time `since`, if given)"""
+    events = TruckEvent.objects.order_by('-timestamp')
+    if since is not None:
+        events = events.filter(timestamp__gt=_sync_start(since))
+    rows = events.values_list(*LIVE_EVENT_FIELDS)[:limit]
+    return [
+        {
+            'id': str(pk),
+            'truck_id': truck_id,
+            'event_type': EVENT_TYPE_LABELS.get(event_type, event_type),
+            'timestamp': timestamp.strftime('%H:%M:%S'),
+            'location': location,
+        }
+        for pk, truck_id, event_type, timestamp, location in rows
+    ]
+
+
+def cv_detections(limit=10):
+    """The latest truck events as api_cv_detections returns them, from one joined query"""
+    rows = TruckEvent.objects.order_by('-timestamp').values_list(*CV_DETECTION_FIELDS)[:limit]
+    return [
+        {
+            'id': str(pk),
+            'truck_id': truck_id,
+            'event_type': event_type,
+            'event_type_display': EVENT_TYPE_LABELS.get(event_type, event_type),
+            'timestamp': timestamp.isoformat(),
+            'location': location,
+            'notes': notes,
+        }
+        for pk, truck_id, event_type, timestamp, location, notes in rows
+    ]
+
+
+def _alert_rows(rows):
+    return [
+        {
+            'id': str(alert_id),
+            'type': alert_type,
+            'priority': priority,
+            'title': title,
+            'message': message,
+            'timestamp': timestamp.strftime('%H:%M:%S'),
+            'acknowledged': acknowledged,
+        }
+        for alert_id, alert_type, priority, title, message, timestamp, acknowledged in rows
+    ]
+
+
+def open_alerts(limit=10):
+    """The latest unacknowledged alerts as api_alerts returns them"""
+    return _alert_rows(
+        Alert.objects.filter(acknowledged=False).order_by('-timestamp').values_list(*ALERT_FIELDS)[:limit]
+    )
+
+
+def changed_alerts(since, limit=50):
+    """
+    Alerts raised, acknowledged or edited since cursor time `since`, oldest
+    change first, or None if there are more than `limit` (the client should
+    take a full list instead)
+    """
+    changed = Alert.objects.filter(updated_at__gt=_sync_start(since)).order_by('updated_at')
+    rows = list(changed.values_list(*ALERT_FIELDS)[:limit + 1])
+    return None if len(rows) > limit else _alert_rows(rows)
+
+
+def encode_cursor(timestamp, pk):
+    """Opaque keyset cursor for the row after which the next page starts"""
+    return base64.urlsafe_b64encode(f'{timestamp.isoformat()}|{pk}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """(timestamp, pk) from encode_cursor(); raises ValueError for anything else"""
+    try:
+        timestamp, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        timestamp, pk = datetime.fromisoformat(timestamp), uuid.UUID(pk)
+    except (TypeError, UnicodeError, ValueError) as e:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from e
+    if timestamp.tzinfo is None:
+        raise ValueError(f'Invalid cursor: {cursor!r}')
+    return timestamp, pk
+
+
+def event_page(events, cursor=None, limit=25):
+    """
+    One page of `events`, newest first, with keyset pagination on
+    (timestamp, id) so every page costs the same however deep it is.
+    Returns (rows, cursor of the next page or None).
+    """
+    events = events.order_by('-timestamp', '-id')
+    if cursor:
+        timestamp, pk = decode_cursor(cursor)
+        events = events.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk))
+    rows = list(events.values_list(*SHIFT_EVENT_FIELDS)[:limit + 1])
+
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    return [
+        {
+            'time': timestamp.strftime('%H:%M:%S'),
+            'truck_id': truck_id,
+            'event_type': event_type,
+            'event_type_display': EVENT_TYPE_LABELS.get(event_type, event_type),
+            'location': location,
+            'truck_status': TRUCK_STATUS_LABELS.get(truck_status, truck_status),
+        }
+        for pk, timestamp, truck_id, event_type, location, truck_status in rows[:limit]
+    ], next_cursor
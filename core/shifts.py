@@ -0,0 +1,45 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import TruckEvent
+
+# Shift names and their local start hours, in order; each runs until the next one starts
+SHIFTS = [('morning', 6), ('evening', 14), ('night', 22)]
+
+
+class Shift:
+    """One shift: its name, the date it started on and its [start, end) time range"""
+
+    def __init__(self, name, date, start, end):
+        self.name = name
+        self.date = date
+        self.start = start
+        self.end = end
+
+    def contains(self, dt):
+        return self.start <= dt < self.end
+
+
+def shift_for(dt=None):
+    """The shift `dt` (default now) falls in; the small hours belong to the previous day's night shift"""
+    local = timezone.localtime(dt or timezone.now())
+    day = local.date()
+    if local.hour < SHIFTS[0][1]:
+        day -= timedelta(days=1)
+
+    starts = [
+        (name, timezone.make_aware(datetime.combine(day, time(hour))))
+        for name, hour in SHIFTS
+    ]
+    starts.append((None, timezone.make_aware(datetime.combine(day + timedelta(days=1), time(SHIFTS[0][1])))))
+    for (name, start), (_, end) in zip(starts, starts[1:]):
+        if start <= local < end:
+            return Shift(name, day, start, end)
+    raise AssertionError(f'No shift covers {local}')
+
+
+def shift_events(shift):
+    """Truck events of a shift so far"""
+    return TruckEvent.objects.filter(timestamp__gte=shift.start, timestamp__lt=shift.end)
+
@@ -0,0 +1,134 @@
+from collections import Counter
+
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Truck, TruckEvent, Equipment, SafetyEvent, Alert, Dock, PerformanceMetrics
+from .identity_cache import truck_cache, equipment_cache
+from . import safety_counters, rollups, versions
+
+# Ingestion writes trucks and equipment with bulk operations, which don't send
+# signals, so these only fire for edits made elsewhere (admin, shell, seeding)
+
+@receiver([post_save, post_delete], sender=Truck)
+def invalidate_truck_identities(sender, **kwargs):
+    truck_cache.invalidate()
+
+@receiver([post_save, post_delete], sender=Equipment)
+def invalidate_equipment_identities(sender, **kwargs):
+    equipment_cache.invalidate()
+
+# Keep SafetyDailyCounter and the hourly event rollups in step with individual
+# saves and deletes. Ingestion bulk-creates events and updates both itself;
+# QuerySet.update() bypasses them, so run rebuild_safety_counters and
+# rebuild_rollups after mass edits.
+
+# Fields the counter and rollup keys of an event are built from
+KEY_FIELDS = {
+    TruckEvent: ('timestamp', 'event_type', 'location'),
+    SafetyEvent: ('timestamp', 'violation_type', 'severity', 'resolved', 'location'),
+}
+
+def _keys(event):
+    """(safety counter key or None, rollup key) an event is counted under"""
+    counter = safety_counters.counter_key(event) if isinstance(event, SafetyEvent) else None
+    return counter, rollups.rollup_key(event)
+
+@receiver(pre_save, sender=TruckEvent)
+@receiver(pre_save, sender=SafetyEvent)
+def remember_stored_keys(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Only updates that may move the event to another key read the stored row
+    instance._stored_keys = None
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(KEY_FIELDS[sender]).intersection(update_fields):
+        instance._stored_keys = _keys(instance)
+        return
+    stored = sender._base_manager.filter(pk=instance.pk).only(*KEY_FIELDS[sender]).first()
+    if stored is not None:
+        instance._stored_keys = _keys(stored)
+
+@receiver(post_save, sender=TruckEvent)
+@receiver(post_save, sender=SafetyEvent)
+def count_event(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = _keys(instance)
+    previous = getattr(instance, '_stored_keys', None)
+    instance._stored_keys = None
+    if created:
+        previous = (None, None)
+    elif previous is None:
+        return
+    if current[0] is not None and previous[0] != current[0]:
+        safety_counters.apply({previous[0]: -1, current[0]: 1} if previous[0] else {current[0]: 1})
+    if previous[1] != current[1]:
+        rollups.apply({previous[1]: -1, current[1]: 1} if previous[1] else {current[1]: 1})
+
+# A delete (of an event, or of a truck cascading to all of its events) sends
+# every pre_delete before any post_delete. The keys are gathered on the
+# deletion's origin and applied together at the first post_delete, one update
+# per key rather than per event.
+
+@receiver(pre_delete, sender=TruckEvent)
+@receiver(pre_delete, sender=SafetyEvent)
+def remember_deleted_keys(sender, instance, origin=None, **kwargs):
+    keys = _keys(instance)
+    if origin is None:
+        instance._deleted_keys = keys
+        return
+    pending = origin.__dict__.setdefault('_deleted_event_keys', {})
+    # Keyed by event, so a delete retried after a failure doesn't count it twice
+    pending[(sender, instance.pk)] = keys
+
+@receiver(post_delete, sender=TruckEvent)
+@receiver(post_delete, sender=SafetyEvent)
+def uncount_events(sender, instance, origin=None, **kwargs):
+    if origin is None:
+        deleted = [instance.__dict__.pop('_deleted_keys', None) or _keys(instance)]
+    else:
+        deleted = origin.__dict__.pop('_deleted_event_keys', {}).values()
+    counters, rollup_rows = Counter(), Counter()
+    for counter, rollup in deleted:
+        if counter is not None:
+            counters[counter] -= 1
+        rollup_rows[rollup] -= 1
+    safety_counters.apply(counters)
+    rollups.apply(rollup_rows)
+
+# Data versions behind the polling APIs' ETags and the view cache keys;
+# ingestion and the rebuild commands bump them themselves
+
+VERSIONED_MODELS = (Truck, TruckEvent, SafetyEvent, Equipment, Alert, Dock, PerformanceMetrics, Group)
+
+def bump_data_version(sender, raw=False, **kwargs):
+    if not raw:
+        versions.bump(sender)
+
+# A delete bumps each model once, not once per deleted (or cascaded) row
+
+def forget_deletion_bumps(sender, origin=None, **kwargs):
+    # A delete retried after a failure has to bump again
+    if origin is not None:
+        origin.__dict__.pop('_bumped_versions', None)
+
+def bump_deleted_version(sender, origin=None, **kwargs):
+    if origin is not None:
+        bumped = origin.__dict__.setdefault('_bumped_versions', set())
+        if sender in bumped:
+            return
+        bumped.add(sender)
+    versions.bump(sender)
+
+for model in VERSIONED_MODELS:
+    post_save.connect(bump_data_version, sender=model)
+    pre_delete.connect(forget_deletion_bumps, sender=model)
+    post_delete.connect(bump_deleted_version, sender=model)
+
+# Cached role masks (core/roles.py) are keyed on the Group data version, so
+# group membership changes bump it too
+
+@receiver(m2m_changed, sender=User.groups.through)
+def bump_group_membership(sender, action, **kwargs):
+    if action.startswith('post_'):
+        versions.bump(Group)
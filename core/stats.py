@@ -0,0 +1,58 @@
+from django.db import connection
+from django.utils import timezone
+
+from .cache import cached
+from .models import Truck, Alert, Dock
+
+ACTIVE_STATUSES = ('gate_in', 'docked', 'loading')
+CRITICAL_PRIORITIES = ('high', 'critical')
+
+
+def _stats_sql():
+    qn = connection.ops.quote_name
+    truck = qn(Truck._meta.db_table)
+    alert = qn(Alert._meta.db_table)
+    dock = qn(Dock._meta.db_table)
+    status = qn(Truck._meta.get_field('current_status').column)
+    acknowledged = qn(Alert._meta.get_field('acknowledged').column)
+    priority = qn(Alert._meta.get_field('priority').column)
+    utilization = qn(Dock._meta.get_field('utilization_rate').column)
+    statuses = ', '.join(['%s'] * len(ACTIVE_STATUSES))
+    priorities = ', '.join(['%s'] * len(CRITICAL_PRIORITIES))
+    # One row from three single-row derived tables: each table is read once
+    # (the alert counts in a single conditional pass) in one round trip.
+    # "NOT acknowledged" is spelled exactly as the partial alert indexes'
+    # predicate; a bound parameter would stop the planner from using them.
+    sql = (
+        f'SELECT trucks.active, alerts.total, alerts.critical, docks.utilization FROM '
+        f'(SELECT COUNT(*) AS active FROM {truck} WHERE {status} IN ({statuses})) AS trucks, '
+        f'(SELECT COUNT(*) AS total, '
+        f'COALESCE(SUM(CASE WHEN {priority} IN ({priorities}) THEN 1 ELSE 0 END), 0) AS critical '
+        f'FROM {alert} WHERE NOT {acknowledged}) AS alerts, '
+        f'(SELECT AVG({utilization}) AS utilization FROM {dock}) AS docks'
+    )
+    return sql, [*ACTIVE_STATUSES, *CRITICAL_PRIORITIES]
+
+
+def compute_stats():
+    """Dashboard statistics, computed with a single query"""
+    sql, params = _stats_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        active_trucks, total_alerts, critical_alerts, utilization = cursor.fetchone()
+    return {
+        'active_trucks': active_trucks,
+        'total_alerts': total_alerts,
+        'critical_alerts': int(critical_alerts),
+        'dock_utilization': round(utilization or 0, 1),
+    }
+
+
+def dashboard_stats(request=None):
+    """
+    The statistics snapshot, shared through core/cache.py: recomputed once
+    (across processes sharing the cache) after a Truck, Alert or Dock change.
+    The timestamp is the time of this request, not of the cached computation.
+    """
+    stats = cached('dashboard_stats', (Truck, Alert, Dock), compute_stats, request=request)
+    return {**stats, 'timestamp': timezone.now().isoformat()}
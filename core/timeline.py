@@ -0,0 +1,64 @@
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from .models import TruckEvent
+
+
+def _limited_ids(truck_pks, limit, latest):
+    """
+    SQL for the IDs of the first/last `limit` events of each truck: one LIMIT
+    subquery per truck, each a short seek on the (truck, timestamp) index,
+    glued together with UNION ALL so it is still a single statement.
+    """
+    qn = connection.ops.quote_name
+    table = qn(TruckEvent._meta.db_table)
+    pk = qn(TruckEvent._meta.pk.column)
+    truck = qn(TruckEvent._meta.get_field('truck').column)
+    timestamp = qn(TruckEvent._meta.get_field('timestamp').column)
+    direction = 'DESC' if latest else 'ASC'
+
+    parts = []
+    params = []
+    for index, truck_pk in enumerate(truck_pks):
+        parts.append(
+            f'SELECT {pk} FROM (SELECT {pk} FROM {table} WHERE {truck} = %s '
+            f'ORDER BY {timestamp} {direction}, {pk} ASC LIMIT %s) AS t{index}'
+        )
+        params += [truck_pk, limit]
+    return RawSQL(' UNION ALL '.join(parts), params)
+
+
+def truck_events(trucks, limit=5, latest=False):
+    """
+    The first (or, with `latest`, the most recent) `limit` events of each truck
+    in `trucks`, as {truck pk: [events in timestamp order]}, fetched with a
+    single query however many trucks there are. Each event's `truck` is the
+    instance passed in, so reading it costs no further queries.
+    """
+    trucks = {truck.pk: truck for truck in trucks}
+    if not trucks:
+        return {}
+
+    events = (
+        TruckEvent.objects
+        .filter(id__in=_limited_ids(list(trucks), limit, latest))
+        .order_by('truck_id', 'timestamp', 'id')
+    )
+
+    timelines = {pk: [] for pk in trucks}
+    for event in events:
+        event.truck = trucks[event.truck_id]
+        timelines[event.truck_id].append(event)
+    return timelines
+
+
+def build_timeline(trucks, limit=5, latest=False):
+    """[{'truck': truck, 'events': [...]}, ...] in the order of `trucks`, for the timeline panels"""
+    trucks = list(trucks)
+    timelines = truck_events(trucks, limit=limit, latest=latest)
+    return [{'truck': truck, 'events': timelines[truck.pk]} for truck in trucks]
+
+
+def recent_events(limit=50):
+    """The latest `limit` truck events with their trucks, in one query"""
+    return TruckEvent.objects.select_related('truck').order_by('-timestamp')[:limit]
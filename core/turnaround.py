@@ -0,0 +1,341 @@
+import logging
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import TruckEvent, SafetyEvent, Dock, PerformanceMetrics, TurnaroundCheckpoint
+from .shifts import SHIFTS
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+# Event types a visit is built from, coded by position
+STAGES = ('gate_in', 'docked', 'loading_start', 'loading_end', 'departed')
+GATE_IN, DOCKED, LOADING_START, LOADING_END, DEPARTED = range(len(STAGES))
+
+# Shifts are equally long and start at SHIFTS[0]'s hour, so local time maps to
+# a shift number with one division
+SHIFT_SECONDS = 24 * 3600 // len(SHIFTS)
+FIRST_SHIFT_SECONDS = SHIFTS[0][1] * 3600
+
+FETCH_ROWS = 500_000
+
+
+def _epoch_sql(column):
+    """SQL for a timestamp column as whole seconds since the epoch, rounded down"""
+    if connection.vendor == 'postgresql':
+        return f'CAST(FLOOR(EXTRACT(EPOCH FROM {column})) AS BIGINT)'
+    if connection.vendor == 'mysql':
+        return f'FLOOR(UNIX_TIMESTAMP({column}))'
+    # SQLite stores text; julianday() parses it much faster than strftime('%s').
+    # The millisecond nudge absorbs julianday's floating point error.
+    return f'CAST((julianday({column}) - 2440587.5) * 86400 + 0.001 AS INTEGER)'
+
+
+def _fetch_arrays(sql, params, columns):
+    """Run `sql` and return its integer columns as numpy arrays, without building model instances"""
+    chunks = []
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.int64).reshape(-1, columns))
+    data = np.concatenate(chunks) if chunks else np.empty((0, columns), dtype=np.int64)
+    return [data[:, index] for index in range(columns)]
+
+
+def _time_range(column, start, end):
+    clauses, params = [], []
+    if start is not None:
+        clauses.append(f'{column} >= %s')
+        params.append(connection.ops.adapt_datetimefield_value(start))
+    if end is not None:
+        clauses.append(f'{column} < %s')
+        params.append(connection.ops.adapt_datetimefield_value(end))
+    return clauses, params
+
+
+def load_events(start=None, end=None):
+    """(truck pk, stage code, epoch seconds) arrays of the visit stage events in [start, end)"""
+    qn = connection.ops.quote_name
+    meta = TruckEvent._meta
+    event_type = qn(meta.get_field('event_type').column)
+    timestamp = qn(meta.get_field('timestamp').column)
+    stage_case = ' '.join(f'WHEN %s THEN {code}' for code in range(len(STAGES)))
+    placeholders = ', '.join(['%s'] * len(STAGES))
+
+    clauses, params = _time_range(timestamp, start, end)
+    where = ' AND '.join([f'{event_type} IN ({placeholders})', *clauses])
+    sql = (
+        f'SELECT {qn(meta.get_field("truck").column)}, CASE {event_type} {stage_case} END, {_epoch_sql(timestamp)} '
+        f'FROM {qn(meta.db_table)} WHERE {where}'
+    )
+    return _fetch_arrays(sql, [*STAGES, *STAGES, *params], 3)
+
+
+def pair_visits(truck, stage, seconds):
+    """
+    Group events into visits, vectorised: each truck's events in time order,
+    a visit opening at every gate_in and taking the first of each later stage
+    that follows it. Events before a truck's first gate_in (a visit that began
+    before the loaded range) are ignored. Returns (truck, gate_in, docked,
+    loading_start, loading_end, departed) arrays, one entry per visit, -1
+    where a stage hasn't happened.
+    """
+    if not len(truck):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty, empty, empty
+
+    order = np.lexsort((stage, seconds, truck))
+    truck, stage, seconds = truck[order], stage[order], seconds[order]
+
+    new_truck = np.empty(len(truck), dtype=bool)
+    new_truck[0] = True
+    np.not_equal(truck[1:], truck[:-1], out=new_truck[1:])
+    starts = new_truck | (stage == GATE_IN)
+    segment = np.cumsum(starts) - 1
+    first = np.flatnonzero(starts)
+
+    def first_time(code):
+        times = np.full(len(first), -1, dtype=np.int64)
+        at = np.flatnonzero(stage == code)
+        segments = segment[at]
+        leading = np.ones(len(at), dtype=bool)
+        np.not_equal(segments[1:], segments[:-1], out=leading[1:])
+        times[segments[leading]] = seconds[at[leading]]
+        return times
+
+    departed = first_time(DEPARTED)
+    middle = []
+    for code in (DOCKED, LOADING_START, LOADING_END):
+        times = first_time(code)
+        # A stage seen after the departure belongs to a visit whose gate_in was missed
+        times[(departed >= 0) & (times > departed)] = -1
+        middle.append(times[stage[first] == GATE_IN])
+
+    is_visit = stage[first] == GATE_IN
+    return (truck[first][is_visit], seconds[first][is_visit], *middle, departed[is_visit])
+
+
+def _local_offsets(seconds):
+    """UTC offset in seconds of the current time zone at each epoch second, looked up once per distinct hour"""
+    hours, inverse = np.unique(seconds // 3600, return_inverse=True)
+    offsets = np.array([
+        timezone.localtime(datetime.fromtimestamp(int(hour) * 3600, tz=dt_timezone.utc)).utcoffset().total_seconds()
+        for hour in hours
+    ], dtype=np.int64)
+    return offsets[inverse]
+
+
+def shift_numbers(seconds):
+    """Shift number (consecutive across days) of each epoch second, in local time"""
+    return (seconds + _local_offsets(seconds) - FIRST_SHIFT_SECONDS) // SHIFT_SECONDS
+
+
+def _shift_bounds(first, last):
+    """Start/end epoch seconds and (date, name) of shift numbers first..last"""
+    starts, ends, keys = [], [], []
+    for number in range(first, last + 1):
+        naive = datetime(1970, 1, 1) + timedelta(seconds=int(number) * SHIFT_SECONDS + FIRST_SHIFT_SECONDS)
+        starts.append(timezone.make_aware(naive).timestamp())
+        ends.append(timezone.make_aware(naive + timedelta(seconds=SHIFT_SECONDS)).timestamp())
+        keys.append((naive.date(), SHIFTS[int(number) % len(SHIFTS)][0]))
+    return np.array(starts), np.array(ends), keys
+
+
+def shift_totals(gate_in, docked, loading_start, loading_end, departed, target_minutes):
+    """
+    Per-shift additions for a batch of closed visits: each visit counts
+    towards the shift it departed in, as does its loading time if both
+    loading stages were seen, and its time at the dock is split over every
+    shift it overlaps. Returns {(date, shift name): {...}}.
+    """
+    if not len(departed):
+        return {}
+    turnaround = (departed - gate_in) / 60.0
+    loaded = (loading_start >= 0) & (loading_end >= loading_start)
+    departed_shift = shift_numbers(departed)
+    at_dock = docked >= 0
+    docked_shift = shift_numbers(docked[at_dock])
+
+    first = int(min(departed_shift.min(), docked_shift.min() if len(docked_shift) else departed_shift.min()))
+    last = int(departed_shift.max())
+    starts, ends, keys = _shift_bounds(first, last)
+    size = last - first + 1
+
+    visits = np.bincount(departed_shift - first, minlength=size)
+    minutes = np.bincount(departed_shift - first, weights=turnaround, minlength=size)
+    on_time = np.bincount(departed_shift - first, weights=turnaround <= target_minutes, minlength=size)
+    loads = np.bincount(departed_shift[loaded] - first, minlength=size)
+    loading = np.bincount(
+        departed_shift[loaded] - first, weights=(loading_end - loading_start)[loaded] / 60.0, minlength=size
+    )
+
+    dock_minutes = np.zeros(size)
+    dock_from, dock_to = docked[at_dock], departed[at_dock]
+    index = docked_shift - first
+    departed_index = departed_shift[at_dock] - first
+    while len(index):
+        overlap = np.minimum(dock_to, ends[index]) - np.maximum(dock_from, starts[index])
+        dock_minutes += np.bincount(index, weights=np.clip(overlap, 0, None) / 60.0, minlength=size)
+        # Carry visits that are still at the dock into the next shift
+        more = index < departed_index
+        index, dock_from, dock_to, departed_index = index[more] + 1, dock_from[more], dock_to[more], departed_index[more]
+
+    return {
+        keys[position]: {
+            'start': starts[position],
+            'end': ends[position],
+            'visits': int(visits[position]),
+            'turnaround_minutes': float(minutes[position]),
+            'on_time': int(on_time[position]),
+            'loads': int(loads[position]),
+            'loading_minutes': float(loading[position]),
+            'dock_minutes': float(dock_minutes[position]),
+        }
+        for position in np.flatnonzero((visits > 0) | (dock_minutes > 0))
+    }
+
+
+def _safety_counts(totals):
+    """Safety events in each shift of `totals`, from one query over their time span"""
+    qn = connection.ops.quote_name
+    timestamp = qn(SafetyEvent._meta.get_field('timestamp').column)
+    span_start = datetime.fromtimestamp(min(t['start'] for t in totals.values()), tz=dt_timezone.utc)
+    span_end = datetime.fromtimestamp(max(t['end'] for t in totals.values()), tz=dt_timezone.utc)
+    clauses, params = _time_range(timestamp, span_start, span_end)
+    sql = f'SELECT {_epoch_sql(timestamp)} FROM {qn(SafetyEvent._meta.db_table)} WHERE {" AND ".join(clauses)}'
+    (seconds,) = _fetch_arrays(sql, params, 1)
+
+    counts = dict.fromkeys(totals, 0)
+    if len(seconds):
+        numbers, per_shift = np.unique(shift_numbers(seconds), return_counts=True)
+        _, _, keys = _shift_bounds(int(numbers.min()), int(numbers.max()))
+        first = int(numbers.min())
+        for number, count in zip(numbers, per_shift):
+            key = keys[int(number) - first]
+            if key in counts:
+                counts[key] = int(count)
+    return counts
+
+
+def merge_into_metrics(totals):
+    """Add per-shift totals to PerformanceMetrics and re-derive each touched row's averages and percentages"""
+    if not totals:
+        return 0
+    docks = Dock.objects.count()
+    safety = _safety_counts(totals)
+    existing = {
+        (row.date, row.shift): row
+        for row in PerformanceMetrics.objects.filter(date__in={date for date, _ in totals})
+    }
+
+    created, updated = [], []
+    for key, added in totals.items():
+        row = existing.get(key)
+        if row is None:
+            row = PerformanceMetrics(date=key[0], shift=key[1])
+            created.append(row)
+        else:
+            updated.append(row)
+        row.visit_count += added['visits']
+        row.turnaround_minutes_total += added['turnaround_minutes']
+        row.on_time_count += added['on_time']
+        row.load_count += added['loads']
+        row.loading_minutes_total += added['loading_minutes']
+        row.dock_minutes_total += added['dock_minutes']
+
+        # Derived only from the running totals, so rows seeded with sample values are replaced outright
+        visits = row.visit_count
+        row.total_trucks = visits
+        row.avg_turnaround_time = round(row.turnaround_minutes_total / visits, 1) if visits else 0.0
+        row.on_time_percentage = round(row.on_time_count * 100 / visits, 1) if visits else 0.0
+        row.delay_percentage = round(100 - row.on_time_percentage, 1) if visits else 0.0
+        row.avg_loading_time = round(row.loading_minutes_total / row.load_count, 1) if row.load_count else 0.0
+        shift_minutes = (added['end'] - added['start']) / 60
+        row.dock_utilization = round(min(100.0, row.dock_minutes_total * 100 / (docks * shift_minutes)), 1) if docks else 0.0
+        row.safety_violations = safety[key]
+
+    PerformanceMetrics.objects.bulk_create(created, batch_size=1000)
+    PerformanceMetrics.objects.bulk_update(updated, [
+        'total_trucks', 'avg_turnaround_time', 'on_time_percentage', 'delay_percentage', 'avg_loading_time',
+        'dock_utilization', 'safety_violations', 'visit_count', 'turnaround_minutes_total', 'on_time_count',
+        'load_count', 'loading_minutes_total', 'dock_minutes_total',
+    ], batch_size=1000)
+    return len(totals)
+
+
+def run(full=False, now=None):
+    """
+    Pair the truck events since the last run into visits and add the visits
+    that have closed since then to their shifts' PerformanceMetrics. Visits
+    still open are picked up again next time; ones open longer than
+    TURNAROUND_MAX_VISIT_HOURS are given up on. `full` starts over from the
+    first event. Returns a summary of the run.
+    """
+    started = time.perf_counter()
+    target = getattr(settings, 'TURNAROUND_TARGET_MINUTES', 90)
+    max_visit = getattr(settings, 'TURNAROUND_MAX_VISIT_HOURS', 24) * 3600
+    # Leave recent events to ingest transactions that may still be committing. A
+    # whole second, so every event before it has an epoch second before it too.
+    until = (now or timezone.now()).replace(microsecond=0) - timedelta(
+        seconds=getattr(settings, 'TURNAROUND_SETTLE_SECONDS', 60)
+    )
+
+    checkpoint, _ = TurnaroundCheckpoint.objects.get_or_create(pk=1)
+    scan_from = None if full else checkpoint.scan_from
+    counted_until = None if full else checkpoint.counted_until
+
+    truck, stage, seconds = load_events(scan_from, until)
+    loaded = time.perf_counter()
+    _, gate_in, docked, loading_start, loading_end, departed = pair_visits(truck, stage, seconds)
+
+    after = counted_until.timestamp() if counted_until else float('-inf')
+    closed = (departed >= 0) & (departed >= after) & (departed - gate_in <= max_visit)
+    still_open = (departed < 0) & (gate_in >= until.timestamp() - max_visit)
+    totals = shift_totals(
+        gate_in[closed], docked[closed], loading_start[closed], loading_end[closed], departed[closed], target
+    )
+
+    with transaction.atomic():
+        current = TurnaroundCheckpoint.objects.select_for_update().get(pk=1)
+        if (current.scan_from, current.counted_until) != (checkpoint.scan_from, checkpoint.counted_until):
+            # Another run got here first; its results already include ours
+            return {'skipped': True}
+        if full:
+            # Every column merge_into_metrics writes, so shifts without visits don't keep stale values
+            PerformanceMetrics.objects.update(
+                visit_count=0, turnaround_minutes_total=0.0, on_time_count=0, load_count=0,
+                loading_minutes_total=0.0, dock_minutes_total=0.0, total_trucks=0, avg_turnaround_time=0.0,
+                on_time_percentage=0.0, delay_percentage=0.0, avg_loading_time=0.0, dock_utilization=0.0,
+                safety_violations=0,
+            )
+        shifts = merge_into_metrics(totals)
+        if shifts or full:
+            versions.bump(PerformanceMetrics)
+        current.scan_from = (
+            datetime.fromtimestamp(int(gate_in[still_open].min()), tz=dt_timezone.utc) if still_open.any() else until
+        )
+        current.counted_until = until
+        current.save()
+
+    summary = {
+        'events': len(truck),
+        'visits': int(closed.sum()),
+        'open_visits': int(still_open.sum()),
+        'shifts': shifts,
+        'load_seconds': round(loaded - started, 2),
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+    if summary['visits']:
+        logger.info(
+            f"Turnaround: {summary['visits']} visits closed into {shifts} shifts "
+            f"from {summary['events']} events in {summary['seconds']}s"
+        )
+    return summary
@@ -18,6 +18,9 @@ urlpatterns = [
     path('api/live-events/', views.api_live_events, name='api_live_events'),
     path('api/alerts/', views.api_alerts, name='api_alerts'),
     path('api/cv-detections/', views.api_cv_detections, name='api_cv_detections'),
+    path('api/shift-events/', views.api_shift_events, name='api_shift_events'),
+    path('api/detections/', views.api_push_detections, name='api_push_detections'),
+    path('api/metrics/', views.api_metrics, name='api_metrics'),
     path('api/site-map/', views.api_site_map, name='api_site_map'),
     path('api/dashboard-stats/', views.api_dashboard_stats, name='api_dashboard_stats'),
     
@@ -1,3 +1,4 @@
+import hmac
 import json
 import os
 from datetime import datetime, timedelta
@@ -66,4 +67,12 @@ def create_sample_json_detections():
     with open(sample_file, 'w') as f:
         json.dump(sample_data, f, indent=2)
     
-    return sample_file
\ No newline at end of file
+    return sample_file
+
+def bearer_token_valid(request, tokens):
+    """Whether the request's Authorization header carries one of `tokens` as a bearer token"""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return False
+    return any(hmac.compare_digest(token.encode(), allowed.encode()) for allowed in tokens)
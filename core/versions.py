@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .models import DataVersion
+
+
+def version_name(model):
+    return model._meta.label_lower
+
+
+def bump(*models):
+    """
+    Count a change to each of `models`. Writers call this inside the
+    transaction that changes them, as late as possible: the counter row stays
+    locked until the commit, and readers see the new version together with
+    the data.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Sorted, so concurrent writers lock the rows in the same order
+        for name in sorted({version_name(model) for model in models}):
+            versions = DataVersion.objects.filter(name=name)
+            if not versions.update(version=F('version') + 1, updated_at=now):
+                DataVersion.objects.bulk_create([DataVersion(name=name)], ignore_conflicts=True)
+                versions.update(version=F('version') + 1, updated_at=now)
+
+
+def _all_versions():
+    return {
+        name: (version, updated_at)
+        for name, version, updated_at in DataVersion.objects.values_list('name', 'version', 'updated_at')
+    }
+
+
+def current(*models, rows=None):
+    """
+    ({model label: version}, time of the latest change or None) of `models`.
+    Reads every counter in one query (there is one per model) unless `rows`
+    already holds them. Models never written through bump() are at version 0.
+    """
+    rows = _all_versions() if rows is None else rows
+    names = [version_name(model) for model in models]
+    changed = [rows[name][1] for name in names if name in rows]
+    return {name: rows.get(name, (0, None))[0] for name in names}, max(changed, default=None)
+
+
+def for_request(request, *models):
+    """
+    current(*models), with the counters read once per request. They are held
+    on the request's user, which access checks (given only the user) and the
+    view itself share, so one read serves both.
+    """
+    holder = getattr(request, 'user', request)
+    rows = getattr(holder, '_data_versions', None)
+    if rows is None:
+        rows = holder._data_versions = _all_versions()
+    return current(*models, rows=rows)
+
+
+def conditional(*models):
+    """
+    View decorator: ETag and Last-Modified from the data versions of
+    `models`, answering a matching conditional GET with 304 Not Modified
+    before the view runs (one small query, none against the data itself)
+    """
+    def etag(request, *args, **kwargs):
+        versions, _ = for_request(request, *models)
+        return '-'.join(f'{name}:{version}' for name, version in versions.items())
+
+    def last_modified(request, *args, **kwargs):
+        return for_request(request, *models)[1]
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -2,8 +2,14 @@ from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import AuthenticationForm
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.exceptions import RequestDataTooBig
 from django.http import JsonResponse, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST, require_GET
+from django.views.decorators.cache import cache_control
+from django.conf import settings
 from django.utils import timezone
+from django.db.models import Sum, Avg
 from datetime import datetime, timedelta
 import json
 import os
@@ -15,8 +21,18 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 
-from .models import Truck, TruckEvent, Dock, Equipment, SafetyEvent, Alert, PerformanceMetrics
-from .detection_handler import DetectionProcessor
+from .models import (
+    Truck, TruckEvent, Dock, Equipment, SafetyEvent, Alert, PerformanceMetrics, EventRollup, SafetyDailyCounter
+)
+from .push_ingest import push_token_valid, decode_batch, get_push_ingester
+from .detection_handler import detection_processor
+from .timeline import build_timeline, recent_events
+from .utils import bearer_token_valid
+from .cache import cached
+from . import metrics, serializers
+from .stats import dashboard_stats
+from .shifts import shift_for, shift_events
+from . import safety_counters, rollups, versions, roles
 
 # Authentication Views
 def custom_login(request):
@@ -35,18 +51,18 @@ def custom_login(request):
     
     return render(request, 'registration/login.html', {'form': form})
 
-# Access Control Functions
+# Access Control Functions (role masks are cached, see core/roles.py)
 def check_operations_access(user):
-    return user.groups.filter(name='Operations').exists() or user.is_superuser
+    return roles.has_role(user, roles.OPERATIONS)
 
 def check_supervisor_access(user):
-    return user.groups.filter(name='Supervisor').exists() or user.is_superuser
+    return roles.has_role(user, roles.SUPERVISOR)
 
 def check_executive_access(user):
-    return user.groups.filter(name='Executive').exists() or user.is_superuser
+    return roles.has_role(user, roles.EXECUTIVE)
 
 def check_safety_access(user):
-    return user.groups.filter(name='Safety').exists() or user.is_superuser
+    return roles.has_role(user, roles.SAFETY)
 
 # Main Dashboard Views
 @login_required
@@ -54,13 +70,14 @@ def dashboard_home(request):
     """Redirect users to their appropriate dashboard based on role"""
     if request.user.is_superuser:
         return redirect('operations_dashboard')
-    elif request.user.groups.filter(name='Operations').exists():
+    mask = roles.user_roles(request.user)
+    if mask & roles.OPERATIONS:
         return redirect('operations_dashboard')
-    elif request.user.groups.filter(name='Supervisor').exists():
+    elif mask & roles.SUPERVISOR:
         return redirect('supervisor_dashboard')
-    elif request.user.groups.filter(name='Executive').exists():
+    elif mask & roles.EXECUTIVE:
         return redirect('executive_dashboard')
-    elif request.user.groups.filter(name='Safety').exists():
+    elif mask & roles.SAFETY:
         return redirect('safety_dashboard')
     else:
         # Default to operations dashboard
@@ -70,35 +87,24 @@ def dashboard_home(request):
 @user_passes_test(check_operations_access)
 def operations_dashboard(request):
     """Operations Dashboard - Live View"""
-    # Process any new detection files
-    processor = DetectionProcessor()
-    processor.monitor_detection_files()
-    
-    # Get live data
-    active_trucks = Truck.objects.all().order_by('-id')[:20]
-    recent_events = TruckEvent.objects.all().order_by('-timestamp')[:50]
-    active_alerts = Alert.objects.filter(acknowledged=False).order_by('-timestamp')[:10]
-    docks = Dock.objects.all()
-    equipment = Equipment.objects.all()
-    
-    # Prepare timeline data
-    timeline_data = []
-    for truck in active_trucks:
-        events = truck.truckevent_set.all().order_by('timestamp')[:5]
-        timeline_data.append({
-            'truck': truck,
-            'events': events
-        })
-    
-    context = {
-        'active_trucks': active_trucks,
-        'recent_events': recent_events,
-        'active_alerts': active_alerts,
-        'docks': docks,
-        'equipment': equipment,
-        'timeline_data': timeline_data,
-        'current_time': timezone.now(),
-    }
+    def live_data():
+        # Get live data (detection files are ingested by the run_detection_ingest service)
+        active_trucks = list(Truck.objects.all().order_by('-id')[:20])
+        return {
+            'active_trucks': active_trucks,
+            'recent_events': recent_events(50),
+            'active_alerts': list(
+                Alert.objects.filter(acknowledged=False).select_related('related_truck').order_by('-timestamp')[:10]
+            ),
+            'docks': list(Dock.objects.all()),
+            'equipment': list(Equipment.objects.all()),
+            # First five events of every truck, in one query
+            'timeline_data': build_timeline(active_trucks, limit=5),
+        }
+    
+    # Shared by every operator screen until the next write
+    context = cached('operations', (Truck, TruckEvent, Alert, Dock, Equipment), live_data, request=request)
+    context = {**context, 'current_time': timezone.now()}
     
     return render(request, 'operations.html', context)
 
@@ -106,55 +112,38 @@ def operations_dashboard(request):
 @user_passes_test(check_supervisor_access)
 def supervisor_dashboard(request):
     """Supervisor Dashboard - Shift/Daily Summary"""
-    today = timezone.now().date()
-    shift_start = timezone.now().replace(hour=6, minute=0, second=0, microsecond=0)
-    
-    if timezone.now().hour < 14:
-        current_shift = 'morning'
-    elif timezone.now().hour < 22:
-        current_shift = 'evening'
-    else:
-        current_shift = 'night'
-    
-    # Get shift metrics
-    try:
-        metrics = PerformanceMetrics.objects.get(date=today, shift=current_shift)
-    except PerformanceMetrics.DoesNotExist:
-        metrics = PerformanceMetrics.objects.create(
-            date=today,
-            shift=current_shift,
-            total_trucks=25,
-            avg_turnaround_time=45.5,
-            on_time_percentage=85.0,
-            delay_percentage=15.0,
-            dock_utilization=75.0,
-            safety_violations=2
-        )
-    
-    # Calculate real-time metrics
-    shift_events = TruckEvent.objects.filter(
-        timestamp__gte=shift_start
+    shift = shift_for()
+    today = shift.date
+    current_shift = shift.name
+    
+    def shift_data():
+        # Shift metrics, kept up to date by the turnaround engine; zeros until its
+        # first run counts a visit that departed in this shift
+        metrics = PerformanceMetrics.objects.filter(date=today, shift=current_shift).first()
+        if metrics is None:
+            metrics = PerformanceMetrics(date=today, shift=current_shift)
+        # Real-time event counts; the event list itself is paged in from api_shift_events
+        summary, dockings = rollups.shift_summary(shift)
+        # Dock utilization heatmap data
+        return metrics, summary, dockings, list(Dock.objects.all())
+    
+    metrics, summary, dockings, docks = cached(
+        'supervisor', (TruckEvent, EventRollup, PerformanceMetrics, Dock), shift_data,
+        request=request, parts=(today, current_shift),
     )
     
-    # Calculate event counts safely
-    gate_in_count = shift_events.filter(event_type='gate_in').count()
-    docked_count = shift_events.filter(event_type='docked').count()
-    loading_count = shift_events.filter(event_type='loading_start').count()
-    departed_count = shift_events.filter(event_type='departed').count()
-    
-    # Dock utilization heatmap data
-    docks = Dock.objects.all()
-    
     context = {
         'current_shift': current_shift,
+        'shift': shift,
         'metrics': metrics,
-        'shift_events': shift_events,
+        'shift_event_count': summary['total'],
         'docks': docks,
         'today': today,
-        'gate_in_count': gate_in_count,
-        'docked_count': docked_count,
-        'loading_count': loading_count,
-        'departed_count': departed_count,
+        'gate_in_count': summary['gate_in'],
+        'docked_count': summary['docked'],
+        'loading_count': summary['loading_start'],
+        'departed_count': summary['departed'],
+        'bay_dockings': sorted(dockings.items()),
     }
     
     return render(request, 'supervisor.html', context)
@@ -167,22 +156,25 @@ def executive_dashboard(request):
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=30)
     
-    # Get performance metrics
-    metrics = PerformanceMetrics.objects.filter(
-        date__range=[start_date, end_date]
-    ).order_by('date', 'shift')
-    
-    # Calculate overall KPIs
-    total_trucks = sum(m.total_trucks for m in metrics)
-    avg_turnaround = sum(m.avg_turnaround_time for m in metrics) / len(metrics) if metrics else 0
-    avg_dock_utilization = sum(m.dock_utilization for m in metrics) / len(metrics) if metrics else 0
+    # Overall KPIs, aggregated in the database from the per-shift metrics rows
+    totals = cached(
+        'executive', (PerformanceMetrics,),
+        lambda: PerformanceMetrics.objects.filter(date__range=[start_date, end_date]).aggregate(
+            total_trucks=Sum('total_trucks'),
+            avg_turnaround=Avg('avg_turnaround_time'),
+            avg_dock_utilization=Avg('dock_utilization'),
+        ),
+        request=request, parts=(end_date,),
+    )
+    total_trucks = totals['total_trucks'] or 0
+    avg_turnaround = totals['avg_turnaround'] or 0
+    avg_dock_utilization = totals['avg_dock_utilization'] or 0
     
     # ROI Calculations (simplified)
     cost_savings = (avg_turnaround * 50) - (avg_turnaround * 45)  # Example calculation
     efficiency_index = min(100, (avg_dock_utilization * 100) / 85)  # Target 85% utilization
     
     context = {
-        'metrics': metrics,
         'total_trucks': total_trucks,
         'avg_turnaround': round(avg_turnaround, 2),
         'avg_dock_utilization': round(avg_dock_utilization, 2),
@@ -198,23 +190,33 @@ def executive_dashboard(request):
 def safety_dashboard(request):
     """Safety Officer Dashboard"""
     today = timezone.now().date()
+    # A range rather than timestamp__date, which can't use the timestamp index
+    day_start = timezone.make_aware(datetime.combine(today, datetime.min.time()))
     safety_events = SafetyEvent.objects.filter(
-        timestamp__date=today
+        timestamp__gte=day_start,
+        timestamp__lt=day_start + timedelta(days=1)
     ).order_by('-timestamp')
     
-    unresolved_events = safety_events.filter(resolved=False)
-    critical_events = safety_events.filter(severity__in=['high', 'critical'])
+    def day_data():
+        # Totals and the per-type breakdown come from the daily counters, so they
+        # cost the same however many violations the cameras report
+        return (
+            list(safety_events[:50]),
+            list(safety_events.filter(severity__in=safety_counters.CRITICAL_SEVERITIES)[:10]),
+            safety_counters.breakdown(today),
+        )
     
-    # Violation statistics
-    violation_types = {}
-    for event in safety_events:
-        violation_types[event.violation_type] = violation_types.get(event.violation_type, 0) + 1
+    events, critical_events, summary = cached(
+        'safety', (SafetyEvent, SafetyDailyCounter), day_data, request=request, parts=(today,)
+    )
     
     context = {
-        'safety_events': safety_events,
-        'unresolved_events': unresolved_events,
+        'safety_events': events,
         'critical_events': critical_events,
-        'violation_types': violation_types,
+        'total_count': summary['total'],
+        'unresolved_count': summary['unresolved'],
+        'critical_count': summary['critical'],
+        'violation_types': summary['violation_types'],
         'today': today,
     }
     
@@ -249,64 +251,65 @@ def admin_panel(request):
     return render(request, 'admin.html')
 
 # API endpoints for real-time data
+def _sync_request(request, model):
+    """
+    (since, cursor) for a delta-sync poll: the time decoded from the `since`
+    parameter (None for a full response) and the cursor to hand back, the
+    time of the model's latest change. Raises ValueError for a bad cursor.
+    """
+    since = request.GET.get('since')
+    since = serializers.decode_since(since) if since else None
+    _, changed_at = versions.for_request(request, model)
+    return since, serializers.encode_since(changed_at or timezone.now())
+
+# The polling APIs below take `since` (the `cursor` of the previous response)
+# to return only what is new, and answer a poll with a current ETag with 304
+# Not Modified without reading the events or alerts
 @login_required
+@cache_control(private=True, no_cache=True)
+@versions.conditional(TruckEvent)
 def api_live_events(request):
     """API endpoint for live events (AJAX)"""
-    events = TruckEvent.objects.all().order_by('-timestamp')[:20]
-    events_data = []
-    
-    for event in events:
-        events_data.append({
-            'truck_id': event.truck.truck_id,
-            'event_type': event.get_event_type_display(),
-            'timestamp': event.timestamp.strftime('%H:%M:%S'),
-            'location': event.location,
-        })
-    
-    return JsonResponse({'events': events_data})
+    try:
+        since, cursor = _sync_request(request, TruckEvent)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return serializers.json_response(cached(
+        'live_events', (TruckEvent,),
+        lambda: {'events': serializers.live_events(20, since), 'cursor': cursor, 'full': since is None},
+        request=request, parts=(request.GET.get('since', ''),),
+    ))
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@versions.conditional(Alert)
 def api_alerts(request):
     """API endpoint for alerts (AJAX)"""
-    alerts = Alert.objects.filter(acknowledged=False).order_by('-timestamp')[:10]
-    alerts_data = []
-    
-    for alert in alerts:
-        alerts_data.append({
-            'id': str(alert.alert_id),
-            'type': alert.alert_type,
-            'priority': alert.priority,
-            'title': alert.title,
-            'message': alert.message,
-            'timestamp': alert.timestamp.strftime('%H:%M:%S'),
-        })
-    
-    return JsonResponse({'alerts': alerts_data})
+    try:
+        since, cursor = _sync_request(request, Alert)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    def payload():
+        alerts = serializers.changed_alerts(since) if since else None
+        return {
+            'alerts': serializers.open_alerts(10) if alerts is None else alerts,
+            'cursor': cursor,
+            'full': alerts is None,
+        }
+    
+    return serializers.json_response(
+        cached('alerts', (Alert,), payload, request=request, parts=(request.GET.get('since', ''),))
+    )
 
 @login_required
 def api_cv_detections(request):
     """API endpoint for computer vision detections"""
     try:
-        # Process any new detection files
-        processor = DetectionProcessor()
-        processor.monitor_detection_files()
-        
         # Return recent detections
-        recent_events = TruckEvent.objects.all().order_by('-timestamp')[:10]
-        events_data = []
-        
-        for event in recent_events:
-            events_data.append({
-                'id': str(event.id),
-                'truck_id': event.truck.truck_id,
-                'event_type': event.event_type,
-                'event_type_display': event.get_event_type_display(),
-                'timestamp': event.timestamp.isoformat(),
-                'location': event.location,
-                'notes': event.notes,
-            })
+        events_data = cached('cv_detections', (TruckEvent,), lambda: serializers.cv_detections(10), request=request)
         
-        return JsonResponse({
+        return serializers.json_response({
             'status': 'success',
             'detections': events_data,
             'total': len(events_data)
@@ -318,10 +321,74 @@ def api_cv_detections(request):
             'message': str(e)
         }, status=500)
 
+@login_required
+@user_passes_test(check_supervisor_access)
+def api_shift_events(request):
+    """API endpoint for the current shift's events, newest first, a page at a time (?cursor=...&limit=...)"""
+    shift = shift_for()
+    cursor = request.GET.get('cursor')
+    try:
+        limit = min(max(int(request.GET.get('limit', 25)), 1), 100)
+        events, next_cursor = cached(
+            'shift_events', (Truck, TruckEvent),
+            lambda: serializers.event_page(shift_events(shift), cursor=cursor, limit=limit),
+            request=request, parts=(shift.date, shift.name, cursor or '', limit),
+        )
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    return serializers.json_response({'events': events, 'next': next_cursor})
+
+@csrf_exempt
+@require_POST
+def api_push_detections(request):
+    """API endpoint for cameras to push detection batches without the file drop"""
+    if not push_token_valid(request):
+        return JsonResponse({'status': 'error', 'message': 'Invalid or missing token'}, status=401)
+    
+    try:
+        documents = decode_batch(request.body, request.META.get('HTTP_CONTENT_ENCODING', ''))
+    except RequestDataTooBig:
+        return JsonResponse({'status': 'error', 'message': 'Batch too large'}, status=413)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    
+    ingester = get_push_ingester()
+    if not ingester.offer(documents):
+        # Backpressure: the ingester is behind, ask the camera to retry later
+        response = JsonResponse({'status': 'busy', 'message': 'Ingest queue full'}, status=429)
+        response['Retry-After'] = str(ingester.retry_after())
+        return response
+    
+    return JsonResponse({
+        'status': 'queued',
+        'documents': len(documents),
+        'queue_depth': ingester.depth(),
+    }, status=202)
+
+@require_GET
+def api_metrics(request):
+    """Prometheus metrics for detection ingestion (for a logged-in user or a METRICS_TOKENS bearer token)"""
+    if not (request.user.is_authenticated or bearer_token_valid(request, getattr(settings, 'METRICS_TOKENS', []))):
+        return HttpResponse("Unauthorized", status=401, content_type='text/plain')
+    
+    backlog = detection_processor.backlog()
+    metrics.PENDING_FILES.set(backlog['pending_files'])
+    metrics.OLDEST_PENDING.set(backlog['lag_seconds'])
+    
+    # This process plus whatever the ingest service and the other web workers have published recently
+    metrics.start_publishing('web')
+    snapshots = metrics.read_snapshots()
+    snapshots[f'web-{os.getpid()}'] = metrics.registry.snapshot()
+    return HttpResponse(metrics.render(snapshots), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @login_required
 def api_site_map(request):
     """API endpoint for site map data"""
-    docks = Dock.objects.all()
+    return JsonResponse(cached('site_map', (Dock, Equipment, Truck), _site_map_data, request=request))
+
+def _site_map_data():
+    docks = Dock.objects.select_related('current_truck')
     equipment = Equipment.objects.all()
     
     map_data = {
@@ -352,35 +419,13 @@ def api_site_map(request):
             'location': eq.current_location
         })
     
-    return JsonResponse(map_data)
+    return map_data
 
 @login_required
 def api_dashboard_stats(request):
     """API endpoint for dashboard statistics"""
-    # Real-time statistics
-    active_trucks = Truck.objects.filter(
-        current_status__in=['gate_in', 'docked', 'loading']
-    ).count()
-    
-    total_alerts = Alert.objects.filter(acknowledged=False).count()
-    critical_alerts = Alert.objects.filter(
-        acknowledged=False, 
-        priority__in=['high', 'critical']
-    ).count()
-    
-    # Dock utilization
-    docks = Dock.objects.all()
-    total_utilization = sum(dock.utilization_rate for dock in docks) / len(docks) if docks else 0
-    
-    stats = {
-        'active_trucks': active_trucks,
-        'total_alerts': total_alerts,
-        'critical_alerts': critical_alerts,
-        'dock_utilization': round(total_utilization, 1),
-        'timestamp': timezone.now().isoformat()
-    }
-    
-    return JsonResponse(stats)
+    # Shared snapshot, recomputed after its data changes rather than per poll
+    return serializers.json_response(dashboard_stats(request))
 
 # Report Download Functions
 @login_required
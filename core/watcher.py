@@ -0,0 +1,278 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from collections import deque
+
+from .metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class LatencyStats:
+    """Rolling pickup-latency statistics (file written -> handed to the processor)"""
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, latency):
+        with self.lock:
+            self.samples.append(latency)
+            self.count += 1
+            self.total += latency
+            self.max = max(self.max, latency)
+
+    def snapshot(self):
+        with self.lock:
+            ordered = sorted(self.samples)
+            count, total, worst = self.count, self.total, self.max
+
+        def percentile(p):
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+        return {
+            'files': count,
+            'mean_ms': round(total / count * 1000, 2) if count else 0.0,
+            'p50_ms': round(percentile(0.50) * 1000, 2),
+            'p95_ms': round(percentile(0.95) * 1000, 2),
+            'p99_ms': round(percentile(0.99) * 1000, 2),
+            'max_ms': round(worst * 1000, 2),
+        }
+
+
+class _Inotify:
+    """Minimal ctypes binding for Linux inotify"""
+
+    def __init__(self, path, mask):
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            raise OSError(errno.ENOSYS, 'libc not available')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify not available')
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f'inotify_add_watch failed for {path}')
+
+    def read_events(self, timeout):
+        """Yield (mask, name) pairs, waiting up to `timeout` seconds for the first one"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(buffer):
+            _, mask, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b'\0')
+            offset += length
+            yield mask, os.fsdecode(name)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DetectionWatcher:
+    """
+    Hand detection files in a directory to a callback, once their size and
+    mtime have been stable for `settle_time`, using inotify or polling
+    ('auto' prefers inotify). With `batch_size`, paths come in lists.
+    """
+
+    def __init__(self, directory, callback, accept=None, mode='auto', batch_size=None,
+                 poll_interval=0.25, settle_time=0.05, rescan_interval=30.0):
+        self.directory = str(directory)
+        self.callback = callback
+        self.batch_size = batch_size
+        self.accept = accept or (lambda name: True)
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.rescan_interval = rescan_interval
+        self.latency = LatencyStats()
+        self.running = False
+        self.thread = None
+        self.active_mode = None
+
+        # name -> ((size, mtime_ns), due)
+        self._pending = {}
+
+    def start(self):
+        """Start watching in a background thread"""
+        inotify = None
+        if self.mode in ('auto', 'inotify'):
+            try:
+                inotify = _Inotify(self.directory, IN_CLOSE_WRITE | IN_MOVED_TO)
+            except OSError as e:
+                if self.mode == 'inotify':
+                    raise
+                logger.info(f"inotify unavailable ({e}), falling back to polling")
+
+        self.active_mode = 'inotify' if inotify else 'poll'
+        self.running = True
+        target = self._inotify_loop if inotify else self._poll_loop
+        self.thread = threading.Thread(target=target, args=(inotify,) if inotify else (), daemon=True)
+        self.thread.start()
+        logger.info(f"Watching {self.directory} ({self.active_mode} mode)")
+
+    def stop(self):
+        """Stop watching"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def stats(self):
+        """Pickup-latency statistics plus the number of files waiting to settle"""
+        stats = self.latency.snapshot()
+        stats['mode'] = self.active_mode
+        stats['settling'] = len(self._pending)
+        return stats
+
+    def _inotify_loop(self, inotify):
+        # Start with a scan for files written before the watch existed
+        last_rescan = None
+        while self.running:
+            try:
+                if last_rescan is None or time.monotonic() - last_rescan >= self.rescan_interval:
+                    # Also the safety net for anything the kernel queue may have dropped
+                    self._scan()
+                    last_rescan = time.monotonic()
+
+                timeout = self._next_timeout(default=0.5)
+                try:
+                    events = list(inotify.read_events(timeout))
+                except OSError as e:
+                    return self._fall_back_to_polling(inotify, f"inotify watch on {self.directory} failed ({e})")
+
+                for mask, name in events:
+                    if mask & IN_Q_OVERFLOW:
+                        logger.warning("inotify queue overflow, rescanning directory")
+                        self._scan()
+                    elif mask & IN_IGNORED:
+                        return self._fall_back_to_polling(inotify, f"Watch on {self.directory} removed")
+                    elif name:
+                        self._observe(name)
+
+                self._dispatch_settled()
+            except Exception as e:
+                # Keep watching; events lost with the error are picked up by a rescan
+                logger.error(f"Error in inotify watcher: {str(e)}")
+                last_rescan = None
+                time.sleep(self.poll_interval)
+        inotify.close()
+
+    def _fall_back_to_polling(self, inotify, reason):
+        logger.warning(f"{reason}, falling back to polling")
+        try:
+            inotify.close()
+        except OSError:
+            pass
+        self.active_mode = 'poll'
+        self._poll_loop()
+
+    def _poll_loop(self):
+        while self.running:
+            try:
+                self._scan()
+                self._dispatch_settled()
+            except Exception as e:
+                logger.error(f"Error in polling watcher: {str(e)}")
+            time.sleep(self._next_timeout(default=self.poll_interval))
+
+    def _next_timeout(self, default):
+        if not self._pending:
+            return default
+        soonest = min(due for _, due in self._pending.values())
+        return max(0.0, min(default, soonest - time.monotonic()))
+
+    def _scan(self):
+        try:
+            with STAGE_SECONDS.time(stage='scan'), os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        self._observe(entry.name)
+        except FileNotFoundError:
+            pass
+
+    def _observe(self, name):
+        """Note a file as (re)written; it is dispatched once it stops changing"""
+        if not self.accept(name):
+            return
+        try:
+            st = os.stat(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            self._pending.pop(name, None)
+            return
+
+        signature = (st.st_size, st.st_mtime_ns)
+        previous = self._pending.get(name)
+        if previous and previous[0] == signature:
+            return
+        self._pending[name] = (signature, time.monotonic() + self.settle_time)
+
+    def _dispatch_settled(self):
+        now = time.monotonic()
+        ready = []
+        for name, (signature, due) in sorted(self._pending.items()):
+            if due > now:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[name]
+                continue
+
+            if (st.st_size, st.st_mtime_ns) != signature:
+                # Still being written, wait for it to settle again
+                self._pending[name] = ((st.st_size, st.st_mtime_ns), now + self.settle_time)
+                continue
+
+            del self._pending[name]
+            self.latency.add(max(0.0, time.time() - st.st_mtime))
+            ready.append(path)
+
+        if self.batch_size:
+            for start in range(0, len(ready), self.batch_size):
+                self._handle(ready[start:start + self.batch_size])
+        else:
+            for path in ready:
+                self._handle(path)
+
+    def _handle(self, item):
+        try:
+            self.callback(item)
+        except Exception as e:
+            logger.error(f"Error handling detection file(s) {item}: {str(e)}")
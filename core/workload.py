@@ -0,0 +1,417 @@
+import heapq
+import json
+import math
+import multiprocessing
+import os
+import random
+from datetime import datetime, timedelta
+
+from django.db import connection, connections
+from django.utils import timezone
+
+from .models import Truck, TruckEvent, SafetyEvent, Alert, Equipment
+from . import safety_counters, rollups, versions
+from .detection_handler import SIMULATOR_SOURCE
+
+# Truck visit stages and the lognormal dwell before each one: (median minutes, sigma)
+STAGES = (
+    ('docked', 'gate_to_dock'),
+    ('loading_start', 'dock_to_loading'),
+    ('loading_end', 'loading'),
+    ('departed', 'loading_to_departure'),
+)
+
+DEFAULT_DWELL = {
+    'gate_to_dock': (12.0, 0.8),
+    'dock_to_loading': (6.0, 0.6),
+    'loading': (40.0, 0.4),
+    'loading_to_departure': (8.0, 0.5),
+}
+
+TRUCK_STATUS = {
+    'gate_in': 'gate_in',
+    'docked': 'docked',
+    'loading_start': 'loading',
+    'loading_end': 'loading',
+    'departed': 'departed',
+    'delay': 'delayed',
+}
+
+COMPANIES = ['Logistics Inc', 'Transport Co', 'Cargo Express', 'Fast Freight', 'Northern Haulage', 'Bay Carriers']
+DRIVERS = ['John Smith', 'Mike Johnson', 'Sarah Wilson', 'David Brown', 'Ana Lopez', 'Wei Chen', 'Priya Patel', 'Tom Baker']
+GATES = ['Gate 1', 'Gate 2']
+YARD_LOCATIONS = ['Main Yard', 'Loading Zone A', 'Loading Zone B', 'Storage Area', 'Maintenance Bay']
+
+VIOLATIONS = [('no_ppe', 0.45), ('overspeed', 0.25), ('zone_breach', 0.2), ('unsafe_operation', 0.1)]
+SEVERITIES = [('low', 0.4), ('medium', 0.35), ('high', 0.2), ('critical', 0.05)]
+EQUIPMENT_STATUSES = [('active', 0.6), ('idle', 0.35), ('maintenance', 0.05)]
+EQUIPMENT_TYPES = ['forklift', 'forklift', 'forklift', 'loader', 'crane']
+
+
+class YardProfile:
+    """Parameters of a simulated yard"""
+
+    def __init__(self, trucks=500, equipment=40, docks=12, arrivals_per_hour=30.0, diurnal=0.6,
+                 safety_per_hour=0.5, equipment_changes_per_hour=1.0, delay_threshold=60.0, dwell=None):
+        self.trucks = trucks
+        self.equipment = equipment
+        self.docks = docks
+        self.arrivals_per_hour = arrivals_per_hour
+        self.diurnal = diurnal
+        self.safety_per_hour = safety_per_hour
+        self.equipment_changes_per_hour = equipment_changes_per_hour
+        self.delay_threshold = delay_threshold
+        self.dwell = {**DEFAULT_DWELL, **(dwell or {})}
+
+    def rate_factor(self, moment):
+        """Relative traffic at a time of day: peaks early afternoon, quietest around 02:00"""
+        if timezone.is_aware(moment):
+            moment = timezone.localtime(moment)
+        hour = moment.hour + moment.minute / 60
+        return 1 + self.diurnal * math.sin(2 * math.pi * (hour - 8) / 24)
+
+
+def truck_id(number):
+    return f'TRK{number:05d}'
+
+
+def equipment_id(number):
+    return f'EQ{number:03d}'
+
+
+def truck_identity(number):
+    """Stable fleet attributes for a truck number"""
+    rng = random.Random(number)
+    return {
+        'truck_id': truck_id(number),
+        'license_plate': f'{rng.choice("ABCDEFGHJKLMNPRSTVWXYZ")}{rng.choice("ABCDEFGHJKLMNPRSTVWXYZ")}{rng.randint(1000, 9999)}',
+        'driver_name': rng.choice(DRIVERS),
+        'company': rng.choice(COMPANIES),
+    }
+
+
+def _weighted(rng, choices):
+    return rng.choices([value for value, _ in choices], weights=[weight for _, weight in choices])[0]
+
+
+def _poisson_times(rng, start, end, rate_per_hour, profile=None):
+    """Arrival times of a (diurnally modulated) Poisson process, by thinning"""
+    if rate_per_hour <= 0:
+        return
+    peak = rate_per_hour * (1 + profile.diurnal if profile else 1)
+    moment = start
+    while True:
+        moment += timedelta(hours=rng.expovariate(peak))
+        if moment >= end:
+            return
+        if rng.random() * peak <= rate_per_hour * (profile.rate_factor(moment) if profile else 1):
+            yield moment
+
+
+def simulate(profile, start, end, seed=0):
+    """
+    Yield (timestamp, stream, record) in timestamp order for the truck visits,
+    safety violations and equipment changes in the yard between `start` and
+    `end`; `stream` is the record's detection document section.
+    """
+    rng = random.Random(seed)
+    pending = []
+    sequence = 0
+
+    def push(moment, stream, record):
+        nonlocal sequence
+        sequence += 1
+        heapq.heappush(pending, (moment, sequence, stream, record))
+
+    def sources():
+        for moment in _poisson_times(rng, start, end, profile.arrivals_per_hour, profile):
+            yield moment, 'arrival'
+        yield end, None
+
+    safety = _poisson_times(random.Random(seed + 1), start, end, profile.safety_per_hour, profile)
+    changes = _poisson_times(
+        random.Random(seed + 2), start, end, profile.equipment_changes_per_hour * profile.equipment
+    )
+    next_safety = next(safety, None)
+    next_change = next(changes, None)
+    side = random.Random(seed + 3)
+
+    for now, kind in sources():
+        # Everything scheduled before this arrival can be emitted in order
+        while next_safety is not None and next_safety <= now:
+            push(next_safety, 'safety_violations', {
+                'violation_type': _weighted(side, VIOLATIONS),
+                'severity': _weighted(side, SEVERITIES),
+                'location': side.choice(YARD_LOCATIONS + [f'Bay {side.randint(1, profile.docks)}']),
+                'description': 'Simulated safety violation',
+            })
+            next_safety = next(safety, None)
+        while next_change is not None and next_change <= now:
+            number = side.randrange(profile.equipment)
+            push(next_change, 'equipment_status', {
+                'equipment_id': equipment_id(number),
+                'equipment_type': EQUIPMENT_TYPES[number % len(EQUIPMENT_TYPES)],
+                'status': _weighted(side, EQUIPMENT_STATUSES),
+                'location': side.choice(YARD_LOCATIONS),
+            })
+            next_change = next(changes, None)
+        while pending and pending[0][0] <= now:
+            moment, _, stream, record = heapq.heappop(pending)
+            yield moment, stream, record
+
+        if kind is None:
+            break
+
+        number = rng.randrange(profile.trucks)
+        bay = f'Bay {rng.randint(1, profile.docks)}'
+        push(now, 'truck_detections', {
+            'truck_id': truck_id(number), 'event_type': 'gate_in', 'location': rng.choice(GATES),
+        })
+        moment = now
+        for event_type, dwell in STAGES:
+            median, sigma = profile.dwell[dwell]
+            minutes = rng.lognormvariate(math.log(median), sigma)
+            if dwell == 'gate_to_dock' and minutes > profile.delay_threshold:
+                push(moment + timedelta(minutes=profile.delay_threshold), 'truck_detections', {
+                    'truck_id': truck_id(number), 'event_type': 'delay', 'location': 'Gate queue',
+                    'duration_minutes': int(profile.delay_threshold),
+                })
+            moment += timedelta(minutes=minutes)
+            push(moment, 'truck_detections', {
+                'truck_id': truck_id(number),
+                'event_type': event_type,
+                'location': rng.choice(GATES) if event_type == 'departed' else bay,
+                'duration_minutes': round(minutes),
+            })
+
+    # Visits still in progress at `end` are cut off there
+    while pending and pending[0][0] <= end:
+        moment, _, stream, record = heapq.heappop(pending)
+        yield moment, stream, record
+
+
+class DatabaseSink:
+    """Bulk-insert simulated records straight into the event tables"""
+
+    def __init__(self, batch_size=5000):
+        self.batch_size = batch_size
+        self.trucks = dict(Truck.objects.values_list('truck_id', 'pk'))
+        self.equipment = dict(Equipment.objects.values_list('equipment_id', 'pk'))
+        self.truck_events, self.safety_events, self.alerts = [], [], []
+        self.truck_status = {}
+        self.equipment_status = {}
+        self.counts = {'truck_detections': 0, 'safety_violations': 0, 'equipment_status': 0, 'alerts': 0}
+
+    def add(self, moment, stream, record):
+        self.counts[stream] += 1
+        if stream == 'truck_detections':
+            truck_pk = self.trucks[record['truck_id']]
+            self.truck_events.append(TruckEvent(
+                truck_id=truck_pk,
+                event_type=record['event_type'],
+                timestamp=moment,
+                location=record['location'],
+                duration_minutes=record.get('duration_minutes'),
+                notes='Simulated detection',
+            ))
+            self.truck_status[record['truck_id']] = (moment, TRUCK_STATUS[record['event_type']])
+            if record['event_type'] == 'delay':
+                self.alerts.append(Alert(
+                    alert_type='delay', priority='high', timestamp=moment, related_truck_id=truck_pk,
+                    title=f"Truck #{record['truck_id']} delayed at gate",
+                    message=f"Truck has been waiting for {record['duration_minutes']} minutes exceeding threshold",
+                ))
+        elif stream == 'safety_violations':
+            self.safety_events.append(SafetyEvent(timestamp=moment, **record))
+            if record['severity'] in ('high', 'critical'):
+                self.alerts.append(Alert(
+                    alert_type='safety', priority=record['severity'], timestamp=moment,
+                    title=f"Safety Violation - {record['violation_type']}", message=record['description'],
+                ))
+        else:
+            self.equipment_status[record['equipment_id']] = (moment, record['status'], record['location'])
+            if record['status'] == 'maintenance':
+                self.alerts.append(Alert(
+                    alert_type='equipment', priority='high', timestamp=moment,
+                    related_equipment_id=self.equipment[record['equipment_id']],
+                    title=f"Equipment Maintenance - {record['equipment_id']}",
+                    message=f"{record['equipment_type']} requires maintenance",
+                ))
+        if len(self.truck_events) + len(self.safety_events) + len(self.alerts) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        TruckEvent.objects.bulk_create(self.truck_events, batch_size=self.batch_size)
+        SafetyEvent.objects.bulk_create(self.safety_events, batch_size=self.batch_size)
+        Alert.objects.bulk_create(self.alerts, batch_size=self.batch_size)
+        self.counts['alerts'] += len(self.alerts)
+        self.truck_events, self.safety_events, self.alerts = [], [], []
+
+    def close(self):
+        self.flush()
+        return {'counts': self.counts, 'truck_status': self.truck_status, 'equipment_status': self.equipment_status}
+
+
+class FileSink:
+    """
+    Write simulated records as detection documents, one file per camera window
+    of `window_seconds`. Each file's mtime is set to the end of its window so
+    replay_detections can play the files back with their original timing, and
+    the documents are marked as simulator output so ingestion keeps each
+    record's simulated timestamp.
+    """
+
+    def __init__(self, directory, window_seconds=60, prefix='sim'):
+        self.directory = directory
+        self.window = timedelta(seconds=window_seconds)
+        self.prefix = prefix
+        self.window_start = None
+        self.document = None
+        self.files = 0
+        self.counts = {'truck_detections': 0, 'safety_violations': 0, 'equipment_status': 0}
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, moment, stream, record):
+        if self.window_start is None or moment >= self.window_start + self.window:
+            self.flush()
+            self.window_start = moment - timedelta(seconds=moment.timestamp() % self.window.total_seconds())
+        self.counts[stream] += 1
+        record = {
+            **record,
+            'timestamp': moment.isoformat(),
+            'detection_id': f'{self.prefix}-{moment:%Y%m%d%H%M%S%f}-{sum(self.counts.values())}',
+        }
+        self.document[stream].append(record)
+
+    def flush(self):
+        if self.document and any(self.document[section] for section in self.counts):
+            name = f'{self.prefix}_{self.window_start:%Y%m%d_%H%M%S}.json'
+            path = os.path.join(self.directory, name)
+            with open(path + '.tmp', 'w') as f:
+                json.dump({
+                    'timestamp': self.window_start.isoformat(),
+                    'source': SIMULATOR_SOURCE,
+                    **self.document,
+                }, f)
+            written_at = (self.window_start + self.window).timestamp()
+            os.utime(path + '.tmp', (written_at, written_at))
+            os.rename(path + '.tmp', path)
+            self.files += 1
+        self.document = {section: [] for section in self.counts}
+
+    def close(self):
+        self.flush()
+        return {'counts': self.counts, 'files': self.files}
+
+
+def prepare_database(profile):
+    """Create the fleet and equipment rows the simulated events refer to"""
+    Truck.objects.bulk_create(
+        [Truck(current_status='departed', **truck_identity(number)) for number in range(profile.trucks)],
+        batch_size=5000, ignore_conflicts=True,
+    )
+    Equipment.objects.bulk_create(
+        [
+            Equipment(
+                equipment_id=equipment_id(number),
+                equipment_type=EQUIPMENT_TYPES[number % len(EQUIPMENT_TYPES)],
+                status='idle',
+                current_location='Main Yard',
+            )
+            for number in range(profile.equipment)
+        ],
+        batch_size=5000, ignore_conflicts=True,
+    )
+
+
+def finish_database(results):
+    """
+    Leave trucks and equipment in the state their last simulated event
+    implies, and count the bulk-created events into the safety counters and
+    hourly rollups (and tell polling clients everything changed)
+    """
+    trucks, equipment = {}, {}
+    for result in results:
+        for key, value in result['truck_status'].items():
+            if key not in trucks or value[0] > trucks[key][0]:
+                trucks[key] = value
+        for key, value in result['equipment_status'].items():
+            if key not in equipment or value[0] > equipment[key][0]:
+                equipment[key] = value
+
+    by_truck_id = Truck.objects.in_bulk(list(trucks), field_name='truck_id')
+    for key, (_, status) in trucks.items():
+        by_truck_id[key].current_status = status
+    Truck.objects.bulk_update(by_truck_id.values(), ['current_status'], batch_size=5000)
+
+    by_equipment_id = Equipment.objects.in_bulk(list(equipment), field_name='equipment_id')
+    for key, (_, status, location) in equipment.items():
+        by_equipment_id[key].status = status
+        by_equipment_id[key].current_location = location
+    Equipment.objects.bulk_update(by_equipment_id.values(), ['status', 'current_location'], batch_size=5000)
+    safety_counters.rebuild()
+    rollups.rebuild()
+    versions.bump(Truck, TruckEvent, SafetyEvent, Equipment, Alert)
+
+
+def _run_slice(task):
+    profile, start, end, seed, target, directory, window_seconds = task
+    if target == 'db':
+        if connection.vendor == 'sqlite':
+            # Slices write concurrently; let SQLite writers wait their turn
+            connection.settings_dict.setdefault('OPTIONS', {})['timeout'] = 300
+        sink = DatabaseSink()
+    else:
+        sink = FileSink(directory, window_seconds, prefix=f'sim{seed}')
+    try:
+        for moment, stream, record in simulate(profile, start, end, seed):
+            sink.add(moment, stream, record)
+        return sink.close()
+    finally:
+        connections.close_all()
+
+
+def generate(profile, start, end, target='files', directory=None, processes=1, window_seconds=60, seed=0):
+    """
+    Simulate the yard from `start` to `end`, split into one time slice per
+    process, writing to the database ('db') or as detection files ('files').
+    Returns the per-stream record counts.
+    """
+    if target == 'db':
+        prepare_database(profile)
+
+    processes = max(1, processes)
+    span = (end - start) / processes
+    tasks = [
+        (profile, start + span * index, start + span * (index + 1), seed + index * 100, target, directory, window_seconds)
+        for index in range(processes)
+    ]
+
+    if processes == 1:
+        results = [_run_slice(tasks[0])]
+    else:
+        # Child processes must open their own database connections
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(processes) as pool:
+            results = pool.map(_run_slice, tasks)
+
+    if target == 'db':
+        finish_database(results)
+
+    totals = {}
+    for result in results:
+        for stream, count in result['counts'].items():
+            totals[stream] = totals.get(stream, 0) + count
+    if target == 'files':
+        totals['files'] = sum(result['files'] for result in results)
+    return totals
+
+
+def default_window(days, start=None):
+    """The `days` leading up to now (or from `start`), as aware datetimes"""
+    if start is None:
+        end = timezone.now()
+        return end - timedelta(days=days), end
+    start = datetime.combine(start, datetime.min.time())
+    start = timezone.make_aware(start) if timezone.is_naive(start) else start
+    return start, start + timedelta(days=days)
@@ -48,6 +48,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.roles',
             ],
         },
     },
@@ -71,6 +72,26 @@ CHANNEL_LAYERS = {
     },
 }
 
+# View cache backend: 'locmem' (per process), 'file' or 'redis' (shared, at DASHBOARD_CACHE_LOCATION)
+DASHBOARD_CACHE = os.environ.get('DASHBOARD_CACHE', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'dashboard',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DASHBOARD_CACHE_LOCATION', str(BASE_DIR / 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('DASHBOARD_CACHE_LOCATION', 'unix:///run/redis/redis.sock'),
+    },
+}
+CACHES = {'default': CACHE_BACKENDS[DASHBOARD_CACHE]}
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -99,6 +120,49 @@ DETECTION_DATA_DIR = BASE_DIR / 'detection_data'
 VIDEO_FEED_DIR = DETECTION_DATA_DIR / 'video_feed'
 JSON_DETECTIONS_DIR = DETECTION_DATA_DIR / 'json_detections'
 
+# Detection file watcher: 'auto' uses inotify where available and falls back to polling
+DETECTION_WATCH_MODE = 'auto'
+DETECTION_WATCH_POLL_INTERVAL = 0.25  # seconds between directory scans in polling mode
+DETECTION_WATCH_SETTLE_TIME = 0.05  # a file must stop changing for this long before pickup
+DETECTION_BATCH_MAX_FILES = 200  # files that settle together are ingested in one transaction
+DETECTION_INGEST_WORKERS = 4  # ingest threads; records are sharded across them by truck_id
+IDENTITY_CACHE_SIZE = 4096  # trucks/equipment whose primary key and status ingestion keeps in memory
+DETECTION_NDJSON_CHUNK_LINES = 1000  # .ndjson lines committed per transaction, with their resume offset
+DETECTION_MANIFEST_CAPACITY = 5_000_000  # processed files/records the in-memory Bloom filter is sized for
+DETECTION_MANIFEST_ERROR_RATE = 0.001  # Bloom false-positive rate at capacity (each costs one index lookup)
+
+# HTTP push ingestion (POST /api/detections/): cameras authenticate with a bearer token
+DETECTION_PUSH_TOKENS = [token for token in os.environ.get('DETECTION_PUSH_TOKENS', '').split(',') if token]
+DETECTION_PUSH_QUEUE_SIZE = 100  # pushed batches held in memory before answering 429
+DETECTION_PUSH_MAX_BYTES = 16 * 1024 * 1024  # uncompressed size limit per pushed batch
+
+# Daily compressed segments of processed files (manage.py compact_detection_archive)
+DETECTION_ARCHIVE_DIR = JSON_DETECTIONS_DIR / 'archive'
+DETECTION_ARCHIVE_COMPACT_INTERVAL = 900  # seconds between compactions in run_detection_ingest; 0 disables
+DETECTION_ARCHIVE_MIN_AGE = 300  # processed files younger than this are left loose
+DETECTION_ARCHIVE_RETENTION_DAYS = None  # delete segments older than this many days; None keeps them forever
+DETECTION_ARCHIVE_COMPRESSION_LEVEL = 6
+DETECTION_ARCHIVE_BLOCK_BYTES = 256 * 1024  # files are compressed together in blocks of about this size
+
+DETECTION_INGEST_AUTOSTART = False  # ingest in every Django process instead of run_detection_ingest
+
+# Ingest metrics (GET /api/metrics/)
+METRICS_SNAPSHOT_DIR = DETECTION_DATA_DIR / 'metrics'
+METRICS_SNAPSHOT_INTERVAL = 5.0  # seconds between the snapshots each process publishes
+METRICS_TOKENS = [token for token in os.environ.get('METRICS_TOKENS', '').split(',') if token]  # scraper bearer tokens
+INGEST_LOG_INTERVAL = 30.0  # seconds between aggregate "Ingested ..." log lines
+
+# Turnaround engine (manage.py compute_turnaround)
+TURNAROUND_TARGET_MINUTES = 90  # visits gate-to-departure within this are on time
+TURNAROUND_MAX_VISIT_HOURS = 24  # visits open longer than this are dropped as missed departures
+TURNAROUND_SETTLE_SECONDS = 60  # events younger than this are left to the next run
+TURNAROUND_INTERVAL = 300  # seconds between runs in run_detection_ingest; 0 disables
+
+DELTA_SYNC_OVERLAP = 10.0  # seconds a ?since= delta reads before its cursor, for late commits
+VIEW_CACHE_TIMEOUT = 300  # seconds superseded view cache entries linger
+VIEW_CACHE_WAIT = 2.0  # seconds a request waits for another process computing the same entry
+ROLES_CACHE_TIMEOUT = 300  # seconds an unused role mask is kept
+
 # Create detection directories
 os.makedirs(JSON_DETECTIONS_DIR, exist_ok=True)
 os.makedirs(VIDEO_FEED_DIR, exist_ok=True)
\ No newline at end of file
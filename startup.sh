@@ -12,5 +12,8 @@ python manage.py migrate
 # Create superuser if not exists (set in environment variables)
 echo "from django.contrib.auth import get_user_model; User = get_user_model(); User.objects.filter(username='$DJANGO_SUPERUSER_USERNAME').exists() or User.objects.create_superuser('$DJANGO_SUPERUSER_USERNAME', '$DJANGO_SUPERUSER_EMAIL', '$DJANGO_SUPERUSER_PASSWORD')" | python manage.py shell
 
+# Start the detection ingest service (web workers only read)
+python manage.py run_detection_ingest &
+
 # Start Gunicorn
 gunicorn dashboard.wsgi:application --bind 0.0.0.0:8000 --workers 3
\ No newline at end of file